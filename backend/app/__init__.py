@@ -0,0 +1,4 @@
+# Load backend/.env once, before any module reads its settings
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -1,26 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import BigInteger, case, insert, or_, select, type_coerce, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.sql import func
 from pydantic import BaseModel, validator, Field
 from typing import List, Optional
+from collections import defaultdict
+from itertools import groupby
+from datetime import date, datetime
+from decimal import Decimal
+import csv
+import io
 import json
-from app.database import get_db
-from app.models import User, Group, GroupMember, Expense, ExpenseSplit, SplitType
+import time
+from app import database, events, http_cache, idempotency, metrics
+from app.database import SessionLocal, get_async_db, get_db
+from app.models import User, Group, GroupMember, Expense, ExpenseSplit, SplitType, GroupBalance, PairwiseDebt, \
+    ExpenseRollupMonthly, utcnow
+from app import intents, ledger, rollups
+from app.cache import make_cache, make_key, normalize_query
+from app.export import ExportFormat, export_response, group_export_query, user_export_query
+from app.money import Money, allocate, from_cents, to_cents
+from app.settlement import SettlementStrategy, settle_cents
+import functools
 import math
-from openai import OpenAI
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client():
+    """The OpenAI client, created on first use: importing openai is the slowest part of startup."""
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Caches for LLM results, keyed on the normalized query and on (intent, data)
+parse_cache = make_cache("parse_query")
+response_cache = make_cache("generate_response")
 
 # Pydantic model for request body
 class ChatRequest(BaseModel):
     query: str
     current_user_id: int = None
 
-def parse_query(query: str, current_user_name: str = None):
+async def parse_query(query: str, current_user_name: str = None):
+    cache_key = make_key(normalize_query(query), current_user_name)
+    cached = parse_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
         prompt = f"""
         Parse this query: '{query}'
@@ -36,120 +66,162 @@ def parse_query(query: str, current_user_name: str = None):
             {"role": "system", "content": "You are an assistant that parses queries to determine intents and extract entities."},
             {"role": "user", "content": prompt}
         ]
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=100,
-            temperature=0
-        )
-        return json.loads(response.choices[0].message.content.strip())
+        with metrics.llm_call("parse_query") as call:
+            response = await get_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=100,
+                temperature=0
+            )
+            call.record_usage(response.usage)
+        parsed = json.loads(response.choices[0].message.content.strip())
     except Exception as e:
         raise HTTPException(status_code=422, detail=f"Failed to parse query: {str(e)}")
+    parse_cache.set(cache_key, parsed)
+    return parsed
 
-def generate_response(intent: str, data: dict):
+async def generate_response(intent: str, data: dict):
+    cache_key = make_key(intent, data)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
         messages = [
             {"role": "system", "content": "Generate natural language responses based on the intent and data provided. For 'get_user_balance', say how much the user owes or is owed. For 'get_user_expenses', list the expenses with description and amount. For 'get_top_payer', state who paid the most."},
             {"role": "user", "content": f"Generate a response for intent '{intent}' with data: {data}"}
         ]
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=100,
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
+        with metrics.llm_call("generate_response") as call:
+            response = await get_openai_client().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=100,
+                temperature=0.7
+            )
+            call.record_usage(response.usage)
+        text = response.choices[0].message.content.strip()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate response: {str(e)}")
+    response_cache.set(cache_key, text)
+    return text
+
+# Queries behind the chat intents (also EXPLAINed by benchmarks.explain_check)
+def user_by_name_query(name: str):
+    return select(User).filter(func.lower(User.name) == name.lower())
+
+def group_by_name_query(name: str):
+    return select(Group).filter(func.lower(Group.name) == name.lower())
+
+def user_net_query(user_id: int, group_id: Optional[int] = None):
+    """Paid minus owed in cents, from the user's monthly rollups (one row per group and month)."""
+    net = type_coerce(ExpenseRollupMonthly.paid, BigInteger) - type_coerce(ExpenseRollupMonthly.owed, BigInteger)
+    query = select(func.sum(net)).filter(ExpenseRollupMonthly.user_id == user_id)
+    if group_id is not None:
+        query = query.filter(ExpenseRollupMonthly.group_id == group_id)
+    return query
+
+def top_payer_query(group_id: int):
+    """The group's biggest payer, from its monthly rollups instead of every expense."""
+    return select(User).join(ExpenseRollupMonthly, ExpenseRollupMonthly.user_id == User.id)\
+        .filter(ExpenseRollupMonthly.group_id == group_id)\
+        .group_by(User.id)\
+        .having(func.sum(ExpenseRollupMonthly.paid_count) > 0)\
+        .order_by(func.sum(type_coerce(ExpenseRollupMonthly.paid, BigInteger)).desc())\
+        .limit(1)
+
+# Chat intent handlers. Each takes the parsed query and returns the response text.
+async def handle_get_user_balance(db: AsyncSession, parsed: dict):
+    user_name = parsed.get("user_name")
+    group_name = parsed.get("group_name")
+    if not user_name:
+        return "Please specify user name."
+    user = (await db.execute(user_by_name_query(user_name))).scalars().first()
+    if not user:
+        return f"User '{user_name}' not found."
+
+    group_id = None
+    data = {"user_name": user_name}
+    if group_name:
+        group = (await db.execute(group_by_name_query(group_name))).scalars().first()
+        if not group:
+            return f"Group '{group_name}' not found."
+        group_id = group.id
+        data["group_name"] = group_name
+    data["balance"] = float(from_cents(await db.scalar(user_net_query(user.id, group_id)) or 0))
+    return await generate_response("get_user_balance", data)
+
+async def handle_get_user_expenses(db: AsyncSession, parsed: dict):
+    user_name = parsed.get("user_name")
+    num_expenses = parsed.get("num_expenses", 3)
+    if not user_name:
+        return "Please specify user name."
+    user = (await db.execute(user_by_name_query(user_name))).scalars().first()
+    if not user:
+        return f"User '{user_name}' not found."
+    expenses = (await db.execute(
+        select(Expense).filter(Expense.paid_by_id == user.id).order_by(Expense.id.desc()).limit(num_expenses)
+    )).scalars().all()
+    data = {"user_name": user_name, "expenses": [{"description": e.description, "amount": float(e.amount)} for e in expenses]}
+    return await generate_response("get_user_expenses", data)
+
+async def handle_get_top_payer(db: AsyncSession, parsed: dict):
+    group_name = parsed.get("group_name")
+    if not group_name:
+        return "Please specify group name."
+    group = (await db.execute(group_by_name_query(group_name))).scalars().first()
+    if not group:
+        return f"Group '{group_name}' not found."
+    top_payer = (await db.execute(top_payer_query(group.id))).scalars().first()
+    if top_payer:
+        data = {"group_name": group_name, "user_name": top_payer.name}
+        return await generate_response("get_top_payer", data)
+    return "No expenses in this group."
+
+INTENT_HANDLERS = {
+    "get_user_balance": handle_get_user_balance,
+    "get_user_expenses": handle_get_user_expenses,
+    "get_top_payer": handle_get_top_payer,
+}
+
+@router.get("/chat/cache/stats")
+def chat_cache_stats():
+    return {"parse_query": parse_cache.stats(), "generate_response": response_cache.stats()}
+
+@router.get("/db/pool/stats")
+def db_pool_stats():
+    # Pools are per worker process, so the numbers describe the worker that answered
+    return {
+        "pid": os.getpid(),
+        "workers": database.WEB_CONCURRENCY,
+        "max_connections": database.DB_MAX_CONNECTIONS or None,
+        "sync": database.pool_stats(database.engine.pool),
+        "async": database.pool_stats(database.async_engine.pool),
+    }
 
 @router.post("/chat")
-async def chat(request: ChatRequest, db: Session = Depends(get_db)):
+async def chat(request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
     query = request.query
     current_user_id = request.current_user_id
     try:
         # Fetch current user's name if current_user_id is provided
         current_user_name = None
         if current_user_id:
-            current_user = db.query(User).filter(User.id == current_user_id).first()
+            current_user = await db.get(User, current_user_id)
             if current_user:
                 current_user_name = current_user.name
             else:
                 return {"response": "Selected user not found."}
 
-        parsed = parse_query(query, current_user_name)
-        intent = parsed["intent"]
-
-        if intent == "get_user_balance":
-            user_name = parsed.get("user_name")
-            group_name = parsed.get("group_name")
-            if not user_name:
-                return {"response": "Please specify user name."}
-            user = db.query(User).filter(User.name.ilike(user_name)).first()
-            if not user:
-                return {"response": f"User '{user_name}' not found."}
-            
-            if group_name:
-                group = db.query(Group).filter(Group.name.ilike(group_name)).first()
-                if not group:
-                    return {"response": f"Group '{group_name}' not found."}
-                paid = db.query(func.sum(Expense.amount)).filter(
-                    Expense.group_id == group.id, Expense.paid_by_id == user.id
-                ).scalar() or 0
-                owed = db.query(func.sum(ExpenseSplit.share_amount)).join(
-                    Expense, ExpenseSplit.expense_id == Expense.id
-                ).filter(
-                    Expense.group_id == group.id, ExpenseSplit.user_id == user.id
-                ).scalar() or 0
-                balance = paid - owed
-                data = {"user_name": user_name, "group_name": group_name, "balance": balance}
-                response = generate_response(intent, data)
-                return {"response": response}
-            else:
-                paid = db.query(func.sum(Expense.amount)).filter(
-                    Expense.paid_by_id == user.id
-                ).scalar() or 0
-                owed = db.query(func.sum(ExpenseSplit.share_amount)).join(
-                    Expense, ExpenseSplit.expense_id == Expense.id
-                ).filter(
-                    ExpenseSplit.user_id == user.id
-                ).scalar() or 0
-                balance = paid - owed
-                data = {"user_name": user_name, "balance": balance}
-                response = generate_response(intent, data)
-                return {"response": response}
-
-        elif intent == "get_user_expenses":
-            user_name = parsed.get("user_name")
-            num_expenses = parsed.get("num_expenses", 3)
-            if not user_name:
-                return {"response": "Please specify user name."}
-            user = db.query(User).filter(User.name.ilike(user_name)).first()
-            if not user:
-                return {"response": f"User '{user_name}' not found."}
-            expenses = db.query(Expense).filter(Expense.paid_by_id == user.id).order_by(Expense.id.desc()).limit(num_expenses).all()
-            data = {"user_name": user_name, "expenses": [{"description": e.description, "amount": e.amount} for e in expenses]}
-            response = generate_response(intent, data)
-            return {"response": response}
-
-        elif intent == "get_top_payer":
-            group_name = parsed.get("group_name")
-            if not group_name:
-                return {"response": "Please specify group name."}
-            group = db.query(Group).filter(Group.name.ilike(group_name)).first()
-            if not group:
-                return {"response": f"Group '{group_name}' not found."}
-            top_payer = db.query(User).join(Expense, Expense.paid_by_id == User.id)\
-                .filter(Expense.group_id == group.id)\
-                .group_by(User.id)\
-                .order_by(func.sum(Expense.amount).desc())\
-                .first()
-            if top_payer:
-                data = {"group_name": group_name, "user_name": top_payer.name}
-                response = generate_response(intent, data)
-                return {"response": response}
-            return {"response": "No expenses in this group."}
-
-        return {"response": "I didn’t understand that query."}
+        # Try the local rule-based parser before paying for an LLM round-trip
+        await intents.name_index.refresh(db)
+        parsed = intents.parse(query, current_user_name)
+        parser = "local"
+        if parsed is None:
+            parsed = await parse_query(query, current_user_name)
+            parser = "llm"
+        handler = INTENT_HANDLERS.get(parsed.get("intent"))
+        if handler is None:
+            return {"response": "I didn’t understand that query.", "parser": parser}
+        return {"response": await handler(db, parsed), "parser": parser}
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -172,7 +244,7 @@ class GroupResponse(BaseModel):
     id: int
     name: str
     users: List[UserResponse]
-    total_expenses: float
+    total_expenses: Money
     class Config:
         from_attributes = True
 
@@ -182,13 +254,16 @@ class SplitInput(BaseModel):
 
 class ExpenseCreate(BaseModel):
     description: str
-    amount: float = Field(gt=0)  # Amount must be positive
+    amount: Money = Field(gt=0, decimal_places=2)  # Positive, whole cents
     paid_by: int
     split_type: SplitType
     splits: List[SplitInput]
 
     @validator("splits")
     def validate_splits(cls, splits, values):
+        # Each user has one split per expense (the splits table's primary key)
+        if len({s.user_id for s in splits}) != len(splits):
+            raise ValueError("Each user may appear only once in splits")
         split_type = values.get("split_type")
         if split_type == SplitType.percentage:
             if not all(s.percentage is not None and s.percentage >= 0 for s in splits):
@@ -202,24 +277,36 @@ class ExpenseResponse(BaseModel):
     id: int
     group_id: int
     description: str
-    amount: float
+    amount: Money
     paid_by: UserResponse
     split_type: SplitType
+    created_at: datetime  # UTC
     splits: List[dict]
     class Config:
         from_attributes = True
 
+class BulkExpenseError(BaseModel):
+    row: int
+    error: str
+
+class BulkExpenseResponse(BaseModel):
+    received: int
+    inserted: int
+    errors: List[BulkExpenseError]
+    elapsed_seconds: float
+    rows_per_second: float
+
 class Balance(BaseModel):
     user_id: int
     name: str
-    net_balance: float
+    net_balance: Money
 
 class Settlement(BaseModel):
     from_user_id: int
     from_user_name: str
     to_user_id: int
     to_user_name: str
-    amount: float
+    amount: Money
 
 class GroupBalancesResponse(BaseModel):
     group_id: int
@@ -231,7 +318,75 @@ class UserBalancesResponse(BaseModel):
     user_id: int
     name: str
     balances: List[dict]
+
+class GroupDebt(BaseModel):
+    group_id: int
+    group_name: str
+    amount: Money
+
+class PairDebt(BaseModel):
+    """What another user owes the requested user (negative: what they are owed)."""
+    user_id: int
+    name: str
+    amount: Money  # Netted across groups
+    groups: List[GroupDebt]
+
+class UserDebtsResponse(BaseModel):
+    user_id: int
+    name: str
+    owed_to_user: Money
+    owed_by_user: Money
+    debts: List[PairDebt]
+
+class PairDebtResponse(BaseModel):
+    user_id: int
+    name: str
+    other_user_id: int
+    other_name: str
+    amount: Money  # What other_user_id owes user_id, netted across groups
+    groups: List[GroupDebt]
+
+class GlobalSettlementResponse(BaseModel):
+    group_ids: Optional[List[int]]
+    strategy: SettlementStrategy
+    balances: List[Balance]
+    settlements: List[Settlement]
+
+class MemberStats(BaseModel):
+    user_id: int
+    name: str
+    paid: Money
+    expenses_paid: int
+    share: Money  # Sum of the user's split shares
+    net: Money  # paid - share
+
+class StatsPeriod(BaseModel):
+    period: date  # The day, or the first day of the month
+    total: Money
+    count: int
+
+class GroupStatsResponse(BaseModel):
+    group_id: int
+    name: str
+    start: Optional[date]
+    end: Optional[date]
+    granularity: rollups.Granularity
+    total: Money
+    count: int
+    top_payers: List[MemberStats]
+    members: List[MemberStats]
+    series: List[StatsPeriod]
     
+def group_totals_query(group_ids: Optional[List[int]] = None):
+    query = select(Expense.group_id, func.sum(Expense.amount)).group_by(Expense.group_id)
+    if group_ids is not None:
+        query = query.filter(Expense.group_id.in_(group_ids))
+    return query
+
+def group_totals(db: Session, group_ids: Optional[List[int]] = None):
+    """Total expense amount per group in a single aggregate query."""
+    return {group_id: total for group_id, total in db.execute(group_totals_query(group_ids))}
+
 # User Endpoints
 @router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -239,6 +394,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    intents.name_index.invalidate()
     return db_user
 
 @router.get("/users", response_model=List[UserResponse])
@@ -253,47 +409,84 @@ def create_group(group: GroupCreate, db: Session = Depends(get_db)):
     if len(users) != len(group.user_ids):
         raise HTTPException(status_code=400, detail="Invalid user IDs")
     
+    # The group and its members commit together, so no reader (or cached
+    # response) ever sees the group without its members
     db_group = Group(name=group.name)
     db.add(db_group)
-    db.commit()
-    db.refresh(db_group)
-    
-    # Add members
+    db.flush()
+
     for user_id in group.user_ids:
         db.add(GroupMember(group_id=db_group.id, user_id=user_id))
+    ledger.init_members(db, db_group.id, group.user_ids)
     db.commit()
+    intents.name_index.invalidate()
     
-    # Fetch group with members and total expenses
-    db_group = db.query(Group).filter(Group.id == db_group.id).first()
-    total_expenses = sum(expense.amount for expense in db_group.expenses)
+    # A new group has no expenses yet
     return GroupResponse(
         id=db_group.id,
         name=db_group.name,
         users=[UserResponse.from_orm(user) for user in users],
-        total_expenses=total_expenses
+        total_expenses=0
     )
 
 @router.get("/groups/{group_id}", response_model=GroupResponse)
-def get_group(group_id: int, db: Session = Depends(get_db)):
-    db_group = db.query(Group).filter(Group.id == group_id).first()
-    if not db_group:
+def get_group(group_id: int, request: Request, db: Session = Depends(get_db)):
+    version = http_cache.group_version(db, group_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Group not found")
-    
-    users = [gm.user for gm in db_group.members]
-    total_expenses = sum(expense.amount for expense in db_group.expenses)
-    return GroupResponse(
-        id=db_group.id,
-        name=db_group.name,
-        users=[UserResponse.from_orm(user) for user in users],
-        total_expenses=total_expenses
+
+    def compute():
+        db_group = db.query(Group)\
+            .options(selectinload(Group.members).selectinload(GroupMember.user))\
+            .filter(Group.id == group_id)\
+            .first()
+        users = [gm.user for gm in db_group.members]
+        total_expenses = group_totals(db, [group_id]).get(group_id, 0)
+        return GroupResponse(
+            id=db_group.id,
+            name=db_group.name,
+            users=[UserResponse.from_orm(user) for user in users],
+            total_expenses=total_expenses
+        )
+
+    return http_cache.cached_response(
+        request, "group", version, {"group_id": group_id}, compute,
+        lambda: http_cache.group_version(db, group_id)
     )
 
 # Expense Endpoints
+def compute_shares(expense: ExpenseCreate):
+    """(user_id, share_amount, percentage) for each split of an expense.
+
+    Shares are allocated in whole cents by largest remainder, so they always
+    add up exactly to the expense amount.
+    """
+    if expense.split_type == SplitType.equal:
+        weights = [1] * len(expense.splits)
+    else:  # percentage
+        weights = [split.percentage for split in expense.splits]
+    cents = allocate(to_cents(expense.amount), weights)
+    return [
+        (split.user_id, from_cents(share), split.percentage if expense.split_type == SplitType.percentage else None)
+        for split, share in zip(expense.splits, cents)
+    ]
+
 @router.post("/groups/{group_id}/expenses", response_model=ExpenseResponse, status_code=status.HTTP_201_CREATED)
-def create_expense(group_id: int, expense: ExpenseCreate, db: Session = Depends(get_db)):
+def create_expense(
+    group_id: int,
+    expense: ExpenseCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: Session = Depends(get_db),
+):
+    # A retried request gets the original response instead of a second expense
+    if idempotency_key is not None:
+        request_hash = idempotency.fingerprint("create_expense", group_id, expense)
+        replayed = idempotency.lookup(db, idempotency_key, request_hash)
+        if replayed is not None:
+            return replayed
+
     # Validate group and paid_by user
-    db_group = db.query(Group).filter(Group.id == group_id).first()
-    if not db_group:
+    if not db.query(Group.id).filter(Group.id == group_id).first():
         raise HTTPException(status_code=404, detail="Group not found")
     
     paid_by = db.query(User).filter(User.id == expense.paid_by).first()
@@ -301,151 +494,672 @@ def create_expense(group_id: int, expense: ExpenseCreate, db: Session = Depends(
         raise HTTPException(status_code=404, detail="Payer not found")
     
     # Validate splits match group members
-    group_user_ids = {gm.user_id for gm in db_group.members}
+    group_user_ids = {user_id for (user_id,) in db.query(GroupMember.user_id).filter(GroupMember.group_id == group_id)}
     split_user_ids = {s.user_id for s in expense.splits}
     if split_user_ids != group_user_ids:
         raise HTTPException(status_code=400, detail="Splits must include all group members")
     
-    # Create expense
-    db_expense = Expense(
+    # Expense, splits, ledger and version are written in one transaction;
+    # RETURNING hands back the new id without a refresh
+    values = {
+        "group_id": group_id,
+        "description": expense.description,
+        "amount": expense.amount,
+        "paid_by_id": expense.paid_by,
+        "split_type": expense.split_type,
+        "created_at": utcnow(),
+    }
+    expense_id = db.execute(insert(Expense).values(**values).returning(Expense.id)).scalar_one()
+    shares = compute_shares(expense)
+    db.execute(insert(ExpenseSplit), [
+        {"expense_id": expense_id, "user_id": user_id, "share_amount": share_amount, "percentage": percentage}
+        for user_id, share_amount, percentage in shares
+    ])
+    # Not added to the session: carries the row's values to the ledger and the event
+    db_expense = Expense(id=expense_id, **values)
+    user_shares = [(user_id, share_amount) for user_id, share_amount, _ in shares]
+    deltas = ledger.apply_expense(db, db_expense, user_shares)
+    rollups.apply_expense(db, db_expense, user_shares)
+    version = http_cache.bump_group_version(db, group_id)
+    events.publish(db, group_id, version, events.expense_event(db_expense, deltas))
+
+    response = ExpenseResponse(
+        id=expense_id,
         group_id=group_id,
         description=expense.description,
         amount=expense.amount,
-        paid_by_id=expense.paid_by,
-        split_type=expense.split_type
+        paid_by=UserResponse.from_orm(paid_by),
+        split_type=expense.split_type,
+        created_at=values["created_at"],
+        splits=[
+            {"user_id": user_id, "share_amount": float(share_amount), "percentage": percentage}
+            for user_id, share_amount, percentage in shares
+        ]
     )
-    db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
-    
-    # Calculate and store splits
-    if expense.split_type == SplitType.equal:
-        share_amount = expense.amount / len(expense.splits)
-        for split in expense.splits:
-            db.add(ExpenseSplit(
-                expense_id=db_expense.id,
-                user_id=split.user_id,
-                share_amount=share_amount
-            ))
-    else:  # percentage
-        for split in expense.splits:
-            share_amount = expense.amount * (split.percentage / 100)
-            db.add(ExpenseSplit(
-                expense_id=db_expense.id,
-                user_id=split.user_id,
-                share_amount=share_amount,
-                percentage=split.percentage
-            ))
+    if idempotency_key is None:
+        db.commit()
+        return response
+
+    idempotency.record(db, idempotency_key, request_hash, status.HTTP_201_CREATED, response)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request with the same key committed first
+        db.rollback()
+        replayed = idempotency.lookup(db, idempotency_key, request_hash)
+        if replayed is None:
+            raise
+        return replayed
+    idempotency.maybe_purge(db)
+    return response
+
+# Bulk import limits and formats
+MAX_BULK_EXPENSES = 50000
+
+def parse_csv_splits(value: str):
+    """Parse '1;2;3' (equal) or '1:50;2:30;3:20' (percentage) into split dicts."""
+    splits = []
+    for part in filter(None, (p.strip() for p in value.split(";"))):
+        user_id, _, percentage = part.partition(":")
+        splits.append({"user_id": user_id, "percentage": percentage or None})
+    return splits
+
+def parse_bulk_body(body: bytes, content_type: str):
+    """Split a bulk upload into per-row payloads.
+
+    Accepts a JSON array, NDJSON (one expense per line) or CSV with columns
+    description, amount, paid_by, split_type, splits. NDJSON lines are
+    returned undecoded so a malformed line only fails its own row.
+    """
+    text = body.decode("utf-8-sig")
+    if "csv" in content_type:
+        rows = list(csv.DictReader(io.StringIO(text)))
+        for row in rows:
+            row["splits"] = parse_csv_splits(row.get("splits") or "")
+        return rows
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return [line for line in text.splitlines() if line.strip()]
+    try:
+        rows = json.loads(text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of expenses")
+    return rows
+
+def bulk_insert_expenses(db: Session, group_id: int, rows: list, all_or_nothing: bool):
+    """Validate rows and insert the valid ones in a single transaction."""
+    db_group = db.query(Group).filter(Group.id == group_id).first()
+    if not db_group:
+        raise HTTPException(status_code=404, detail="Group not found")
+    group_user_ids = {gm.user_id for gm in db_group.members}
+
+    errors = []
+    expenses = []
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+            expense = ExpenseCreate(**row)
+        except (ValueError, TypeError) as e:
+            errors.append(BulkExpenseError(row=row_number, error=str(e)))
+            continue
+        if {s.user_id for s in expense.splits} != group_user_ids:
+            errors.append(BulkExpenseError(row=row_number, error="Splits must include all group members"))
+            continue
+        expenses.append((row_number, expense))
+
+    # Check every payer with one query instead of one per row
+    payer_ids = {expense.paid_by for _, expense in expenses}
+    known_ids = {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(payer_ids))}
+    valid = []
+    for row_number, expense in expenses:
+        if expense.paid_by in known_ids:
+            valid.append(expense)
+        else:
+            errors.append(BulkExpenseError(row=row_number, error="Payer not found"))
+    errors.sort(key=lambda e: e.row)
+
+    if not valid or (errors and all_or_nothing):
+        return 0, errors
+
+    created_at = utcnow()
+    expense_ids = db.execute(
+        insert(Expense).returning(Expense.id, sort_by_parameter_order=True),
+        [
+            {
+                "group_id": group_id,
+                "description": expense.description,
+                "amount": expense.amount,
+                "paid_by_id": expense.paid_by,
+                "split_type": expense.split_type,
+                "created_at": created_at,
+            }
+            for expense in valid
+        ],
+    ).scalars().all()
+
+    split_rows = []
+    deltas = defaultdict(Decimal)
+    pair_deltas = defaultdict(Decimal)
+    rollup_deltas = rollups.RollupDeltas()
+    for expense_id, expense in zip(expense_ids, valid):
+        shares = compute_shares(expense)
+        for user_id, share_amount, percentage in shares:
+            split_rows.append({
+                "expense_id": expense_id,
+                "user_id": user_id,
+                "share_amount": share_amount,
+                "percentage": percentage,
+            })
+        user_shares = [(user_id, share_amount) for user_id, share_amount, _ in shares]
+        for user_id, delta in ledger.expense_deltas(expense.paid_by, expense.amount, user_shares).items():
+            deltas[user_id] += delta
+        for pair, delta in ledger.pair_deltas(expense.paid_by, user_shares).items():
+            pair_deltas[pair] += delta
+        rollup_deltas.add_expense(group_id, created_at, expense.paid_by, expense.amount, user_shares)
+    db.execute(insert(ExpenseSplit), split_rows)
+    ledger.apply_deltas(db, group_id, deltas)
+    ledger.apply_pair_deltas(db, group_id, pair_deltas)
+    rollups.apply(db, rollup_deltas)
+    version = http_cache.bump_group_version(db, group_id)
+    events.publish(db, group_id, version, events.bulk_event(len(valid), deltas))
     db.commit()
-    
-    # Fetch response data
-    db_expense = db.query(Expense).filter(Expense.id == db_expense.id).first()
-    splits = [
-        {"user_id": s.user_id, "share_amount": s.share_amount, "percentage": s.percentage}
-        for s in db_expense.splits
-    ]
-    return ExpenseResponse(
-        id=db_expense.id,
-        group_id=db_expense.group_id,
-        description=db_expense.description,
-        amount=db_expense.amount,
-        paid_by=UserResponse.from_orm(db_expense.paid_by),
-        split_type=db_expense.split_type,
-        splits=splits
+    return len(valid), errors
+
+@router.post("/groups/{group_id}/expenses/bulk", response_model=BulkExpenseResponse)
+async def create_expenses_bulk(
+    group_id: int,
+    request: Request,
+    all_or_nothing: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    start = time.perf_counter()
+    rows = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    if len(rows) > MAX_BULK_EXPENSES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_EXPENSES} expenses per request")
+    inserted, errors = await run_in_threadpool(bulk_insert_expenses, db, group_id, rows, all_or_nothing)
+    elapsed = time.perf_counter() - start
+    return BulkExpenseResponse(
+        received=len(rows),
+        inserted=inserted,
+        errors=errors,
+        elapsed_seconds=round(elapsed, 4),
+        rows_per_second=round(inserted / elapsed, 1) if elapsed > 0 else 0.0
+    )
+
+# Expense listing with keyset pagination (newest first)
+MAX_EXPENSE_PAGE = 10000
+EXPENSE_STREAM_BATCH = 500
+
+def filter_expenses(query, paid_by: Optional[int], split_type: Optional[SplitType],
+                    min_amount: Optional[Decimal], max_amount: Optional[Decimal], before: Optional[int]):
+    if paid_by is not None:
+        query = query.filter(Expense.paid_by_id == paid_by)
+    if split_type is not None:
+        query = query.filter(Expense.split_type == split_type)
+    if min_amount is not None:
+        query = query.filter(Expense.amount >= min_amount)
+    if max_amount is not None:
+        query = query.filter(Expense.amount <= max_amount)
+    if before is not None:
+        query = query.filter(Expense.id < before)
+    return query
+
+def stream_expense_page(query, limit: int):
+    """Stream one page as JSON: {"items": [...], "next_cursor": id | null}.
+
+    Rows are fetched in batches from a dedicated session, so memory stays
+    constant however large the page is. One extra row is read to tell
+    whether another page follows.
+    """
+    query = query.order_by(Expense.id.desc()).limit(limit + 1)
+
+    def generate():
+        db = SessionLocal()
+        try:
+            yield '{"items":['
+            count, last_id, has_more = 0, None, False
+            for row in db.execute(query.execution_options(yield_per=EXPENSE_STREAM_BATCH)):
+                if count == limit:
+                    has_more = True
+                    break
+                item = {
+                    "id": row.id,
+                    "group_id": row.group_id,
+                    "description": row.description,
+                    "amount": float(row.amount),
+                    "paid_by_id": row.paid_by_id,
+                    "paid_by_name": row.paid_by_name,
+                    "split_type": row.split_type.value,
+                    "created_at": row.created_at.isoformat(),
+                }
+                yield ("," if count else "") + json.dumps(item)
+                count += 1
+                last_id = row.id
+            yield '],"next_cursor":' + json.dumps(last_id if has_more else None) + "}"
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+def expense_listing_query():
+    return select(
+        Expense.id,
+        Expense.group_id,
+        Expense.description,
+        Expense.amount,
+        Expense.paid_by_id,
+        User.name.label("paid_by_name"),
+        Expense.split_type,
+        Expense.created_at,
+    ).join(User, User.id == Expense.paid_by_id)
+
+@router.get("/groups/{group_id}/expenses")
+def get_group_expenses(
+    group_id: int,
+    before: Optional[int] = Query(None, description="Cursor: return expenses with id below this"),
+    limit: int = Query(50, ge=1, le=MAX_EXPENSE_PAGE),
+    paid_by: Optional[int] = None,
+    split_type: Optional[SplitType] = None,
+    min_amount: Optional[Decimal] = None,
+    max_amount: Optional[Decimal] = None,
+    db: Session = Depends(get_db),
+):
+    if not db.query(Group.id).filter(Group.id == group_id).first():
+        raise HTTPException(status_code=404, detail="Group not found")
+    query = expense_listing_query().filter(Expense.group_id == group_id)
+    query = filter_expenses(query, paid_by, split_type, min_amount, max_amount, before)
+    return stream_expense_page(query, limit)
+
+@router.get("/users/{user_id}/expenses")
+def get_user_expenses(
+    user_id: int,
+    before: Optional[int] = Query(None, description="Cursor: return expenses with id below this"),
+    limit: int = Query(50, ge=1, le=MAX_EXPENSE_PAGE),
+    group_id: Optional[int] = None,
+    split_type: Optional[SplitType] = None,
+    min_amount: Optional[Decimal] = None,
+    max_amount: Optional[Decimal] = None,
+    db: Session = Depends(get_db),
+):
+    """Expenses paid by the user, newest first."""
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    query = expense_listing_query().filter(Expense.paid_by_id == user_id)
+    if group_id is not None:
+        query = query.filter(Expense.group_id == group_id)
+    query = filter_expenses(query, None, split_type, min_amount, max_amount, before)
+    return stream_expense_page(query, limit)
+
+# Full ledger dumps, one row per split
+@router.get("/groups/{group_id}/export")
+def export_group_expenses(
+    group_id: int,
+    format: ExportFormat = Query(ExportFormat.csv),
+    db: Session = Depends(get_db),
+):
+    if not db.query(Group.id).filter(Group.id == group_id).first():
+        raise HTTPException(status_code=404, detail="Group not found")
+    return export_response(group_export_query(group_id), format, f"group-{group_id}-expenses")
+
+@router.get("/users/{user_id}/export")
+def export_user_expenses(
+    user_id: int,
+    format: ExportFormat = Query(ExportFormat.csv),
+    db: Session = Depends(get_db),
+):
+    """Every split of the expenses the user paid for or shares."""
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    return export_response(user_export_query(user_id), format, f"user-{user_id}-expenses")
+
+# Live updates (server-sent events)
+@router.get("/groups/{group_id}/events")
+async def group_events(group_id: int, last_event_id: Optional[int] = Header(None)):
+    """New expenses of the group and the balance change per member, as they commit."""
+    if await events.group_version(group_id) is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return StreamingResponse(
+        events.stream(group_id, last_event_id),
+        media_type="text/event-stream",
+        # Proxies must not buffer or cache the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 # Balance Endpoints
+def group_balances_query(group_id: int):
+    """(user_id, name, net balance in cents) of every member, from the ledger."""
+    return select(User.id, User.name, func.coalesce(type_coerce(GroupBalance.net_balance, BigInteger), 0))\
+        .join(GroupMember, GroupMember.user_id == User.id)\
+        .outerjoin(GroupBalance, (GroupBalance.group_id == GroupMember.group_id) & (GroupBalance.user_id == User.id))\
+        .filter(GroupMember.group_id == group_id)
+
 @router.get("/groups/{group_id}/balances", response_model=GroupBalancesResponse)
-def get_group_balances(group_id: int, db: Session = Depends(get_db)):
-    db_group = db.query(Group).filter(Group.id == group_id).first()
-    if not db_group:
+def get_group_balances(
+    group_id: int,
+    request: Request,
+    strategy: SettlementStrategy = Query(SettlementStrategy.greedy),
+    db: Session = Depends(get_db),
+):
+    version = http_cache.group_version(db, group_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Group not found")
-    
-    # Calculate net balances
-    balances = []
-    for member in db_group.members:
-        user = member.user
-        total_paid = sum(
-            e.amount for e in db_group.expenses if e.paid_by_id == user.id
+
+    def compute():
+        db_group = db.query(Group).filter(Group.id == group_id).first()
+        # Read net balances (in cents) from the ledger and settle them directly
+        rows = db.execute(group_balances_query(group_id)).all()
+        names = {user_id: name for user_id, name, _ in rows}
+        return balances_response(db_group, [(user_id, cents) for user_id, _, cents in rows], names, strategy)
+
+    return http_cache.cached_response(
+        request, "group_balances", version, {"group_id": group_id, "strategy": strategy.value}, compute,
+        lambda: http_cache.group_version(db, group_id)
+    )
+
+def balances_response(group: Group, cents: List[tuple], names: dict, strategy: SettlementStrategy):
+    """GroupBalancesResponse for (user_id, cents) balances, most indebted first."""
+    cents = sorted(cents, key=lambda b: b[1])
+    return GroupBalancesResponse(
+        group_id=group.id,
+        name=group.name,
+        balances=[
+            {"user_id": user_id, "name": names[user_id], "net_balance": from_cents(amount)}
+            for user_id, amount in cents
+        ],
+        settlements=[
+            {
+                "from_user_id": from_user_id,
+                "from_user_name": names[from_user_id],
+                "to_user_id": to_user_id,
+                "to_user_name": names[to_user_id],
+                "amount": from_cents(amount),
+            }
+            for from_user_id, to_user_id, amount in settle_cents(cents, strategy)
+        ]
+    )
+
+# Spend analytics, read from the daily and monthly rollups (app.rollups)
+MAX_TOP_PAYERS = 100
+
+def rollup_totals(group_id: int, parts, key: str):
+    """Paid, expense count and owed summed per key column over rollup ranges, as one UNION ALL subquery."""
+    selects = []
+    for model, first, last in parts:
+        column = getattr(model, key)
+        selects.append(
+            select(
+                column.label(key),
+                func.sum(type_coerce(model.paid, BigInteger)).label("paid"),
+                func.sum(model.paid_count).label("paid_count"),
+                func.sum(type_coerce(model.owed, BigInteger)).label("owed"),
+            )
+            .where(model.group_id == group_id, *rollups.in_range(model, first, last))
+            .group_by(column)
         )
-        total_owed = sum(
-            s.share_amount for s in user.expense_splits
-            if s.expense.group_id == group_id
+    return union_all(*selects).subquery()
+
+def stats_series_query(group_id: int, parts):
+    """(period, paid cents, expense count) per rollup period."""
+    by_period = rollup_totals(group_id, parts, "period")
+    return select(by_period.c.period, func.sum(by_period.c.paid), func.sum(by_period.c.paid_count))\
+        .group_by(by_period.c.period)
+
+def stats_members_query(group_id: int, parts):
+    """(user_id, name, paid cents, expense count, owed cents) per user."""
+    by_user = rollup_totals(group_id, parts, "user_id")
+    return select(
+        by_user.c.user_id, User.name, func.sum(by_user.c.paid),
+        func.sum(by_user.c.paid_count), func.sum(by_user.c.owed),
+    ).join(User, User.id == by_user.c.user_id)\
+        .group_by(by_user.c.user_id, User.name)\
+        .order_by(by_user.c.user_id)
+
+@router.get("/groups/{group_id}/stats", response_model=GroupStatsResponse)
+def get_group_stats(
+    group_id: int,
+    request: Request,
+    start: Optional[date] = Query(None, alias="from", description="first day (UTC), inclusive"),
+    end: Optional[date] = Query(None, alias="to", description="last day (UTC), inclusive"),
+    granularity: rollups.Granularity = Query(rollups.Granularity.month),
+    top: int = Query(5, ge=1, le=MAX_TOP_PAYERS),
+    db: Session = Depends(get_db),
+):
+    """Spend over time, top payers and per-member totals of a group's expenses in a date range."""
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    version = http_cache.group_version(db, group_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+
+    def compute():
+        db_group = db.query(Group).filter(Group.id == group_id).first()
+        parts = rollups.segments(start, end, granularity)
+
+        series = defaultdict(lambda: [0, 0])
+        for period, cents, count in db.execute(stats_series_query(group_id, parts)):
+            if count:
+                bucket = series[period if granularity == rollups.Granularity.day else rollups.month_start(period)]
+                bucket[0] += cents
+                bucket[1] += count
+
+        members = [
+            MemberStats(
+                user_id=user_id,
+                name=name,
+                paid=from_cents(paid),
+                expenses_paid=count,
+                share=from_cents(owed),
+                net=from_cents(paid - owed),
+            )
+            for user_id, name, paid, count, owed in db.execute(stats_members_query(group_id, parts))
+        ]
+        return GroupStatsResponse(
+            group_id=db_group.id,
+            name=db_group.name,
+            start=start,
+            end=end,
+            granularity=granularity,
+            total=from_cents(sum(cents for cents, _ in series.values())),
+            count=sum(count for _, count in series.values()),
+            top_payers=sorted((m for m in members if m.expenses_paid), key=lambda m: -m.paid)[:top],
+            members=members,
+            series=[
+                {"period": period, "total": from_cents(cents), "count": count}
+                for period, (cents, count) in sorted(series.items())
+            ],
         )
-        net_balance = total_paid - total_owed
-        balances.append(Balance(
-            user_id=user.id,
-            name=user.name,
-            net_balance=round(net_balance, 2)
-        ))
-    
-    # Simplify debts
-    settlements = []
-    balances = sorted(balances, key=lambda b: b.net_balance)
-    i, j = 0, len(balances) - 1
-    while i < j:
-        debtor = balances[i]
-        creditor = balances[j]
-        if abs(debtor.net_balance) < 1e-2 or abs(creditor.net_balance) < 1e-2:
-            if abs(debtor.net_balance) < 1e-2:
-                i += 1
-            if abs(creditor.net_balance) < 1e-2:
-                j -= 1
-            continue
-        amount = min(-debtor.net_balance, creditor.net_balance)
-        settlements.append(Settlement(
-            from_user_id=debtor.user_id,
-            from_user_name=debtor.name,
-            to_user_id=creditor.user_id,
-            to_user_name=creditor.name,
-            amount=round(amount, 2)
-        ))
-        debtor.net_balance += amount
-        creditor.net_balance -= amount
-    
-    return GroupBalancesResponse(
-        group_id=db_group.id,
-        name=db_group.name,
-        balances=balances,
-        settlements=settlements
+
+    params = {"group_id": group_id, "from": start, "to": end, "granularity": granularity.value, "top": top}
+    return http_cache.cached_response(
+        request, "group_stats", version, params, compute,
+        lambda: http_cache.group_version(db, group_id)
+    )
+
+# Dashboards ask for many groups at once
+MAX_BATCH_GROUPS = 1000
+
+@router.get("/balances", response_model=List[GroupBalancesResponse])
+def get_balances_batch(
+    group_ids: List[int] = Query(..., description="repeat for each group: ?group_ids=1&group_ids=2"),
+    strategy: SettlementStrategy = Query(SettlementStrategy.greedy),
+    db: Session = Depends(get_db),
+):
+    from app import balances  # NumPy is imported on first use, not at startup
+
+    group_ids = list(dict.fromkeys(group_ids))
+    if len(group_ids) > MAX_BATCH_GROUPS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_GROUPS} groups per request")
+    groups = {g.id: g for g in db.query(Group).filter(Group.id.in_(group_ids))}
+    missing = [g for g in group_ids if g not in groups]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Groups not found: {missing}")
+
+    table = balances.from_ledger(db, group_ids)
+    names = dict(
+        db.query(User.id, User.name)
+        .join(GroupMember, GroupMember.user_id == User.id)
+        .filter(GroupMember.group_id.in_(group_ids))
+        .distinct()
     )
+    return [balances_response(groups[g], table.group(g), names, strategy) for g in group_ids]
+
 @router.get("/groups", response_model=List[GroupResponse])
-def get_groups(db: Session = Depends(get_db)):
-    groups = db.query(Group).all()
-    return [
-        GroupResponse(
-            id=group.id,
-            name=group.name,
-            users=[UserResponse.from_orm(gm.user) for gm in group.members],
-            total_expenses=sum(expense.amount for expense in group.expenses)
-        )
-        for group in groups
-    ]
+def get_groups(request: Request, db: Session = Depends(get_db)):
+    def compute():
+        groups = db.query(Group)\
+            .options(selectinload(Group.members).selectinload(GroupMember.user))\
+            .all()
+        totals = group_totals(db)
+        return [
+            GroupResponse(
+                id=group.id,
+                name=group.name,
+                users=[UserResponse.from_orm(gm.user) for gm in group.members],
+                total_expenses=totals.get(group.id, 0)
+            )
+            for group in groups
+        ]
+
+    return http_cache.cached_response(
+        request, "groups", http_cache.groups_version(db), {}, compute,
+        lambda: http_cache.groups_version(db)
+    )
+
+def user_balances_query(user_id: int):
+    """(group_id, group_name, net balance) for every group of the user, from the ledger."""
+    return select(Group.id, Group.name, func.coalesce(GroupBalance.net_balance, 0))\
+        .join(GroupMember, GroupMember.group_id == Group.id)\
+        .outerjoin(GroupBalance, (GroupBalance.group_id == Group.id) & (GroupBalance.user_id == GroupMember.user_id))\
+        .filter(GroupMember.user_id == user_id)
+
 @router.get("/users/{user_id}/balances", response_model=UserBalancesResponse)
 def get_user_balances(user_id: int, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    balances = []
-    for gm in user.group_members:
-        group = gm.group
-        total_paid = sum(
-            e.amount for e in group.expenses if e.paid_by_id == user_id
-        )
-        total_owed = sum(
-            s.share_amount for s in user.expense_splits
-            if s.expense.group_id == group.id
-        )
-        net_balance = total_paid - total_owed
-        balances.append({
-            "group_id": group.id,
-            "group_name": group.name,
-            "net_balance": round(net_balance, 2)
-        })
+    rows = db.execute(user_balances_query(user_id)).all()
+    balances = [
+        {"group_id": group_id, "group_name": group_name, "net_balance": float(net_balance)}
+        for group_id, group_name, net_balance in rows
+    ]
     
     return UserBalancesResponse(
         user_id=user.id,
         name=user.name,
         balances=balances
-    )
\ No newline at end of file
+    )
+
+# Pairwise debts, read from the pairwise_debts index (app.ledger)
+def debt_rows_query(user_id: int, other_user_id: Optional[int] = None):
+    """(group_id, group_name, counterparty_id, counterparty_name, cents) of the user's non-zero debts.
+
+    cents is from user_id's side: positive when the counterparty owes them.
+    Only the k rows of the user's pairs are read, via the two pair indexes.
+    """
+    is_low = PairwiseDebt.user_id == user_id
+    counterparty = case((is_low, PairwiseDebt.other_user_id), else_=PairwiseDebt.user_id)
+    cents = type_coerce(PairwiseDebt.amount, BigInteger)
+    query = select(PairwiseDebt.group_id, Group.name, counterparty, User.name, case((is_low, -cents), else_=cents))\
+        .join(Group, Group.id == PairwiseDebt.group_id)\
+        .join(User, User.id == counterparty)\
+        .where(cents != 0)
+    if other_user_id is None:
+        query = query.where(or_(PairwiseDebt.user_id == user_id, PairwiseDebt.other_user_id == user_id))
+    else:
+        low, high = sorted((user_id, other_user_id))
+        query = query.where(PairwiseDebt.user_id == low, PairwiseDebt.other_user_id == high)
+    return query.order_by(counterparty, PairwiseDebt.group_id)
+
+def debt_rows(db: Session, user_id: int, other_user_id: Optional[int] = None):
+    return db.execute(debt_rows_query(user_id, other_user_id)).all()
+
+def pair_debts(rows) -> List[PairDebt]:
+    debts = []
+    for (counterparty, name), group_rows in groupby(rows, key=lambda row: (row[2], row[3])):
+        group_rows = list(group_rows)
+        debts.append(PairDebt(
+            user_id=counterparty,
+            name=name,
+            amount=from_cents(sum(cents for *_, cents in group_rows)),
+            groups=[
+                {"group_id": group_id, "group_name": group_name, "amount": from_cents(cents)}
+                for group_id, group_name, _, _, cents in group_rows
+            ],
+        ))
+    return debts
+
+@router.get("/users/{user_id}/debts", response_model=UserDebtsResponse)
+def get_user_debts(user_id: int, db: Session = Depends(get_db)):
+    """Who owes the user and whom the user owes, per group and netted across groups."""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    debts = pair_debts(debt_rows(db, user_id))
+    return UserDebtsResponse(
+        user_id=user.id,
+        name=user.name,
+        owed_to_user=sum((debt.amount for debt in debts if debt.amount > 0), Decimal(0)),
+        owed_by_user=sum((-debt.amount for debt in debts if debt.amount < 0), Decimal(0)),
+        debts=debts,
+    )
+
+@router.get("/users/{user_id}/debts/{other_user_id}", response_model=PairDebtResponse)
+def get_pair_debt(user_id: int, other_user_id: int, db: Session = Depends(get_db)):
+    """What other_user_id owes user_id (negative: what user_id owes), per group and in total."""
+    if user_id == other_user_id:
+        raise HTTPException(status_code=400, detail="Users must be different")
+    names = dict(db.query(User.id, User.name).filter(User.id.in_([user_id, other_user_id])))
+    for missing in (user_id, other_user_id):
+        if missing not in names:
+            raise HTTPException(status_code=404, detail=f"User {missing} not found")
+    debts = pair_debts(debt_rows(db, user_id, other_user_id))
+    return PairDebtResponse(
+        user_id=user_id,
+        name=names[user_id],
+        other_user_id=other_user_id,
+        other_name=names[other_user_id],
+        amount=debts[0].amount if debts else Decimal(0),
+        groups=debts[0].groups if debts else [],
+    )
+
+@router.get("/settlements", response_model=GlobalSettlementResponse)
+def get_global_settlement(
+    group_ids: Optional[List[int]] = Query(None, description="limit to these groups (default: all)"),
+    strategy: SettlementStrategy = Query(SettlementStrategy.heap),
+    db: Session = Depends(get_db),
+):
+    """Settle everyone's balances netted across groups with as few transfers as the strategy finds.
+
+    Users who are even overall drop out, and a transfer may connect users
+    who share no group.
+    """
+    query = db.query(GroupBalance.user_id, User.name, func.sum(type_coerce(GroupBalance.net_balance, BigInteger)))\
+        .join(User, User.id == GroupBalance.user_id)\
+        .group_by(GroupBalance.user_id, User.name)
+    if group_ids:
+        group_ids = list(dict.fromkeys(group_ids))
+        query = query.filter(GroupBalance.group_id.in_(group_ids))
+    rows = [(user_id, name, int(cents)) for user_id, name, cents in query if cents]
+    names = {user_id: name for user_id, name, _ in rows}
+    cents = sorted(((user_id, amount) for user_id, _, amount in rows), key=lambda b: b[1])
+    return GlobalSettlementResponse(
+        group_ids=group_ids or None,
+        strategy=strategy,
+        balances=[
+            {"user_id": user_id, "name": names[user_id], "net_balance": from_cents(amount)}
+            for user_id, amount in cents
+        ],
+        settlements=[
+            {
+                "from_user_id": from_user_id,
+                "from_user_name": names[from_user_id],
+                "to_user_id": to_user_id,
+                "to_user_name": names[to_user_id],
+                "amount": from_cents(amount),
+            }
+            for from_user_id, to_user_id, amount in settle_cents(cents, strategy)
+        ],
+    )
@@ -0,0 +1,131 @@
+"""Vectorized net balance computation.
+
+Balances are pulled as flat integer-cent columns (no ORM objects and no
+Decimal per row) and reduced with NumPy, so groups with 10k+ members and
+millions of splits stay within a few arrays.
+
+- `from_expenses`: recompute from expenses / expense_splits with two
+  streamed queries, `(group_id, paid_by_id, amount)` and
+  `(group_id, user_id, share_amount)`, summed per (group, user) with bincount.
+- `from_ledger`: read the materialized group_balances ledger.
+
+Both return a `BalanceTable` covering every group member (members without
+expenses or ledger rows count as zero). `BalanceTable.group()` yields the
+(user_id, cents) pairs that `app.settlement.settle_cents` takes directly.
+"""
+from itertools import chain
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import BigInteger, select, type_coerce
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.models import Expense, ExpenseSplit, GroupBalance, GroupMember
+
+# Rows fetched per round trip when streaming expense columns
+CHUNK = 100000
+
+_USER_BITS = 32
+
+
+class BalanceTable:
+    """Net balances in cents, one row per (group_id, user_id), sorted by both."""
+
+    def __init__(self, group_ids: np.ndarray, user_ids: np.ndarray, cents: np.ndarray):
+        self.group_ids = group_ids
+        self.user_ids = user_ids
+        self.cents = cents
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray, cents: np.ndarray) -> "BalanceTable":
+        return cls(keys >> _USER_BITS, keys & ((1 << _USER_BITS) - 1), cents)
+
+    def __len__(self):
+        return len(self.cents)
+
+    def group(self, group_id: int) -> List[Tuple[int, int]]:
+        """(user_id, cents) pairs for one group."""
+        start, stop = np.searchsorted(self.group_ids, [group_id, group_id + 1])
+        return list(zip(self.user_ids[start:stop].tolist(), self.cents[start:stop].tolist()))
+
+    def to_dict(self):
+        """{(group_id, user_id): cents}"""
+        return dict(zip(zip(self.group_ids.tolist(), self.user_ids.tolist()), self.cents.tolist()))
+
+
+def _keys(group_ids: np.ndarray, user_ids: np.ndarray) -> np.ndarray:
+    return (group_ids.astype(np.int64) << _USER_BITS) | user_ids.astype(np.int64)
+
+
+def _reduce(keys: np.ndarray, cents: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum cents per distinct key. Returns (sorted unique keys, sums)."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    # float64 weights add integers exactly while sums stay below 2**53 cents
+    sums = np.bincount(inverse.ravel(), weights=cents, minlength=len(unique))
+    return unique, np.rint(sums).astype(np.int64)
+
+
+def _array(rows, width: int) -> np.ndarray:
+    """Integer result rows as an (n, width) int64 array."""
+    # fromiter over the flattened values avoids NumPy probing each Row object
+    flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows) * width)
+    return flat.reshape(-1, width)
+
+
+def _columns(db: Session, statement) -> Iterable[np.ndarray]:
+    """Stream a three integer column statement as (n, 3) int64 arrays."""
+    result = db.execute(statement.execution_options(yield_per=CHUNK))
+    for rows in result.partitions():
+        yield _array(rows, 3)
+
+
+def _filter(statement, column, group_ids: Optional[Iterable[int]]):
+    return statement if group_ids is None else statement.where(column.in_(list(group_ids)))
+
+
+def _members(db: Session, group_ids: Optional[Iterable[int]]) -> np.ndarray:
+    statement = _filter(select(GroupMember.group_id, GroupMember.user_id), GroupMember.group_id, group_ids)
+    rows = _array(db.execute(statement).all(), 2)
+    return _keys(rows[:, 0], rows[:, 1])
+
+
+def from_expenses(db: Session, group_ids: Optional[Iterable[int]] = None) -> BalanceTable:
+    """Recompute net balances (paid minus owed) from the expense tables.
+
+    Each streamed chunk is reduced to per-(group, user) sums right away, so
+    memory is bounded by the number of members, not the number of splits.
+    """
+    group_ids = None if group_ids is None else list(group_ids)
+    amount = type_coerce(Expense.amount, BigInteger)
+    share = type_coerce(ExpenseSplit.share_amount, BigInteger)
+    paid = _filter(select(Expense.group_id, Expense.paid_by_id, amount), Expense.group_id, group_ids)
+    owed = _filter(
+        select(Expense.group_id, ExpenseSplit.user_id, share).join(Expense, ExpenseSplit.expense_id == Expense.id),
+        Expense.group_id, group_ids,
+    )
+    members = _members(db, group_ids)
+    partial_keys = [members]
+    partial_cents = [np.zeros(len(members), dtype=np.int64)]
+    for statement, sign in ((paid, 1), (owed, -1)):
+        for chunk in _columns(db, statement):
+            keys, cents = _reduce(_keys(chunk[:, 0], chunk[:, 1]), sign * chunk[:, 2])
+            partial_keys.append(keys)
+            partial_cents.append(cents)
+    keys, cents = _reduce(np.concatenate(partial_keys), np.concatenate(partial_cents))
+    return BalanceTable.from_keys(keys, cents)
+
+
+def from_ledger(db: Session, group_ids: Optional[Iterable[int]] = None) -> BalanceTable:
+    """Read net balances for every member of the given groups from group_balances."""
+    statement = _filter(
+        select(GroupMember.group_id, GroupMember.user_id,
+               func.coalesce(type_coerce(GroupBalance.net_balance, BigInteger), 0))
+        .outerjoin(GroupBalance, (GroupBalance.group_id == GroupMember.group_id)
+                   & (GroupBalance.user_id == GroupMember.user_id)),
+        GroupMember.group_id, group_ids,
+    )
+    rows = _array(db.execute(statement).all(), 3)
+    keys = _keys(rows[:, 0], rows[:, 1])
+    order = np.argsort(keys, kind="stable")
+    return BalanceTable.from_keys(keys[order], rows[order, 2])
@@ -0,0 +1,164 @@
+"""Bounded TTL + LRU caches for LLM results (and, with their own settings,
+the group response cache in app.http_cache).
+
+Two backends share the same interface:
+
+- MemoryCache: in-process OrderedDict, the default.
+- SQLiteCache: a SQLite file that several uvicorn workers on one host can
+  share. Enabled with CHAT_CACHE_BACKEND=sqlite (path in CHAT_CACHE_PATH).
+
+Values must be JSON-serializable. Hit/miss/eviction counters are per process
+and exposed through `stats()`.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+CACHE_BACKEND = os.getenv("CHAT_CACHE_BACKEND", "memory")  # memory, sqlite or off
+CACHE_PATH = os.getenv("CHAT_CACHE_PATH", "chat_cache.sqlite3")
+CACHE_MAXSIZE = int(os.getenv("CHAT_CACHE_MAXSIZE", "1024"))
+CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL", "300"))
+
+_MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip("?!. ")
+
+
+def make_key(*parts: Any) -> str:
+    """Canonical key: JSON with sorted dict keys so equal data gives equal keys."""
+    return json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+
+
+class MemoryCache:
+    def __init__(self, name: str, maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCache(MemoryCache):
+    """Same semantics as MemoryCache, stored in a SQLite file shared across workers."""
+
+    def __init__(self, name: str, path: str = CACHE_PATH, maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_TTL_SECONDS):
+        super().__init__(name, maxsize, ttl)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " name TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (name, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_lru ON llm_cache (name, accessed_at)")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE name = ? AND key = ?", (self.name, key)
+            ).fetchone()
+            if row is not None and row[1] < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE name = ? AND key = ?", (self.name, key))
+                self.expirations += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return default
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE name = ? AND key = ?", (now, self.name, key)
+            )
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        if self.maxsize <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (name, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.name, key, json.dumps(value), now + self.ttl, now),
+            )
+            overflow = len(self) - self.maxsize
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE name = ? AND key IN ("
+                    " SELECT key FROM llm_cache WHERE name = ? ORDER BY accessed_at LIMIT ?)",
+                    (self.name, self.name, overflow),
+                )
+                self.evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE name = ?", (self.name,))
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM llm_cache WHERE name = ?", (self.name,)).fetchone()[0]
+
+    def stats(self) -> dict:
+        return {**super().stats(), "backend": "sqlite", "path": self.path}
+
+
+def make_cache(name: str, backend: str = CACHE_BACKEND, path: str = CACHE_PATH,
+               maxsize: int = CACHE_MAXSIZE, ttl: float = CACHE_TTL_SECONDS) -> MemoryCache:
+    """Build a cache for a backend (the chat settings by default). When caching is off nothing is stored."""
+    if backend == "off":
+        return MemoryCache(name, maxsize=0, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(name, path, maxsize, ttl)
+    return MemoryCache(name, maxsize, ttl)
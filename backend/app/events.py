@@ -0,0 +1,298 @@
+"""Live group events, streamed to clients as server-sent events.
+
+`publish(db, group_id, version, event)` is called inside the transaction that
+writes the expense. Subscribers of the group (`GET /groups/{id}/events`)
+receive the event once that transaction commits, and never if it rolls back.
+Every event carries the group version it produced (also the SSE event id).
+
+Two backends, chosen with EVENTS_BACKEND:
+
+- memory (default): pending events are handed to this process's subscribers
+  from the session's after_commit hook. Enough for a single worker and SQLite.
+- postgres: the event is sent with pg_notify in the writing transaction and
+  Postgres delivers it at commit to every worker LISTENing on the channel.
+  A worker opens one dedicated LISTEN connection, outside its pool, when its
+  first client subscribes. NOTIFY payloads are capped at 8000 bytes, so events
+  of very large groups are sent with "deltas": null.
+
+Each subscriber has a bounded queue (EVENTS_QUEUE_SIZE). Publishers never
+wait on slow clients: when a queue is full its backlog is replaced with a
+single "resync" event, after which the client refetches the balances.
+"""
+import asyncio
+import json
+import logging
+import os
+import select as select_module
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import AsyncIterator, Dict, Optional, Set
+
+from sqlalchemy import event as sa_event, func, select
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.database import AsyncSessionLocal, engine
+from app.models import Group
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")  # memory or postgres
+EVENTS_QUEUE_SIZE = max(1, int(os.getenv("EVENTS_QUEUE_SIZE", "100")))
+# Seconds between keep-alive comments on an idle stream
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+
+NOTIFY_CHANNEL = "group_events"
+NOTIFY_MAX_BYTES = 7900
+# Reconnect delay (seconds) of the browser's EventSource
+CLIENT_RETRY_MS = 3000
+
+RESYNC = {"type": "resync"}
+
+_PENDING = "pending_group_events"
+
+log = logging.getLogger("app.events")
+
+
+def expense_event(expense, deltas: Dict[int, Decimal]) -> dict:
+    """A new expense and the net balance change it caused per member."""
+    return {
+        "type": "expense",
+        "expense": {
+            "id": expense.id,
+            "description": expense.description,
+            "amount": float(expense.amount),
+            "paid_by": expense.paid_by_id,
+            "split_type": expense.split_type.value,
+        },
+        "deltas": _deltas(deltas),
+    }
+
+
+def bulk_event(count: int, deltas: Dict[int, Decimal]) -> dict:
+    """A bulk import, summarized as its summed balance change per member."""
+    return {"type": "expenses_bulk", "count": count, "deltas": _deltas(deltas)}
+
+
+def _deltas(deltas: Dict[int, Decimal]) -> list:
+    return [{"user_id": user_id, "delta": float(delta)} for user_id, delta in sorted(deltas.items()) if delta]
+
+
+class Subscription:
+    """One client's bounded queue, owned by the event loop that serves it."""
+
+    def __init__(self, group_id: int, loop: asyncio.AbstractEventLoop):
+        self.group_id = group_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+
+    def put(self, event: dict):
+        """Enqueue without waiting; runs on self.loop."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind to catch up event by event: drop the backlog
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            metrics.event_overflows.inc()
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class Broker:
+    """In-process fan-out from publishers (any thread) to subscriber queues."""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, group_id: int) -> Subscription:
+        subscription = Subscription(group_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[group_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.group_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.group_id]
+
+    def deliver(self, group_id: int, event: dict):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(group_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:  # the subscriber's loop is closed
+                self.unsubscribe(subscription)
+        metrics.events_delivered.inc(len(subscriptions))
+
+    def deliver_all(self, event: dict):
+        with self._lock:
+            group_ids = list(self._subscribers)
+        for group_id in group_ids:
+            self.deliver(group_id, event)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "groups": len(self._subscribers),
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+            }
+
+
+class MemoryBackend:
+    """Deliver to this process's subscribers after the session commits."""
+
+    name = "memory"
+
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        sa_event.listen(Session, "after_commit", self._after_commit)
+        sa_event.listen(Session, "after_rollback", self._after_rollback)
+
+    def publish(self, db: Session, group_id: int, event: dict):
+        db.info.setdefault(_PENDING, []).append((group_id, event))
+
+    def listen(self):
+        pass
+
+    def _after_commit(self, session: Session):
+        for group_id, event in session.info.pop(_PENDING, ()):
+            self.broker.deliver(group_id, event)
+
+    def _after_rollback(self, session: Session):
+        session.info.pop(_PENDING, None)
+
+
+class PostgresBackend:
+    """Fan out across workers (and hosts) through LISTEN/NOTIFY."""
+
+    name = "postgres"
+
+    def __init__(self, broker: Broker, engine):
+        self.broker = broker
+        self.engine = engine
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def publish(self, db: Session, group_id: int, event: dict):
+        payload = json.dumps({"group_id": group_id, "event": event}, separators=(",", ":"))
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            payload = json.dumps({"group_id": group_id, "event": {**event, "deltas": None}}, separators=(",", ":"))
+        # Queued by Postgres and delivered only if the transaction commits
+        db.execute(select(func.pg_notify(NOTIFY_CHANNEL, payload)))
+
+    def listen(self):
+        """Start this process's listener thread on first use."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-events-listener", daemon=True)
+                self._thread.start()
+
+    @staticmethod
+    def _payloads(driver):
+        """Yield NOTIFY payloads as they arrive, from a psycopg2 or a psycopg 3 connection."""
+        if hasattr(driver, "poll"):
+            # psycopg2: wait for the socket, then poll() fills the notifies list
+            while True:
+                if select_module.select([driver], [], [], 5) == ([], [], []):
+                    continue
+                driver.poll()
+                while driver.notifies:
+                    yield driver.notifies.pop(0).payload
+        else:
+            # psycopg 3: notifies() is a generator; the timeout bounds each wait
+            while True:
+                for notify in driver.notifies(timeout=5):
+                    yield notify.payload
+
+    def _run(self):
+        delay = 1
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = self.engine.raw_connection()
+                # A long-lived LISTEN connection must not hold a pool slot
+                connection.detach()
+                driver = connection.driver_connection
+                driver.autocommit = True
+                with driver.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                if connected_before:
+                    # Anything sent while disconnected is lost
+                    self.broker.deliver_all(RESYNC)
+                connected_before = True
+                delay = 1
+                for payload in self._payloads(driver):
+                    message = json.loads(payload)
+                    self.broker.deliver(message["group_id"], message["event"])
+            except Exception:
+                log.exception("group event listener failed; reconnecting in %ss", delay)
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+def make_backend(broker: Broker):
+    if EVENTS_BACKEND == "postgres":
+        if engine.dialect.name != "postgresql":
+            raise ValueError("EVENTS_BACKEND=postgres needs a PostgreSQL DATABASE_URL")
+        return PostgresBackend(broker, engine)
+    return MemoryBackend(broker)
+
+
+broker = Broker()
+backend = make_backend(broker)
+
+
+def publish(db: Session, group_id: int, version: int, event: dict):
+    """Send event to the group's subscribers if the current transaction commits."""
+    backend.publish(db, group_id, {**event, "version": version})
+
+
+async def group_version(group_id: int) -> Optional[int]:
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(Group.version).where(Group.id == group_id))).scalar()
+
+
+def format_event(event: dict) -> str:
+    lines = f"event: {event['type']}\n"
+    if "version" in event:
+        lines = f"id: {event['version']}\n" + lines
+    return lines + f"data: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+async def stream(group_id: int, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+    """The text/event-stream body for one client of a group.
+
+    Starts with a "ready" event carrying the current version (read after
+    subscribing, so nothing committed later is missed) and a "resync" event
+    if a reconnecting client's Last-Event-ID is older than that version.
+    """
+    backend.listen()
+    subscription = broker.subscribe(group_id)
+    try:
+        version = await group_version(group_id)
+        yield f"retry: {CLIENT_RETRY_MS}\n" + format_event({"type": "ready", "version": version})
+        if last_event_id is not None and last_event_id < version:
+            yield format_event(RESYNC)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
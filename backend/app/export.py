@@ -0,0 +1,194 @@
+"""Streaming export of expense splits as CSV, NDJSON or Parquet.
+
+One row per split, joined with the expense, the group, the payer and the
+split user. Rows come from a server-side cursor (`yield_per`) on a
+dedicated session and are encoded batch by batch into a chunked response,
+so memory stays flat however many rows a group or user has.
+
+Parquet uses pyarrow (in requirements.txt), imported on the first Parquet
+export; each batch becomes one row group.
+"""
+import csv
+import enum
+import importlib.util
+import io
+import json
+from decimal import Decimal
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import BigInteger, or_, select, type_coerce
+from sqlalchemy.orm import aliased
+
+from app.database import SessionLocal
+from app.models import Expense, ExpenseSplit, Group, User
+
+EXPORT_BATCH = 5000
+
+COLUMNS = [
+    "expense_id", "group_id", "group_name", "description", "amount", "paid_by_id", "paid_by_name",
+    "split_type", "user_id", "user_name", "share_amount", "percentage",
+]
+MONEY_COLUMNS = ("amount", "share_amount")
+
+
+class ExportFormat(str, enum.Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    parquet = "parquet"
+
+
+def export_query():
+    """All split rows, ordered by expense; amounts are raw integer cents."""
+    payer = aliased(User)
+    member = aliased(User)
+    return select(
+        Expense.id.label("expense_id"),
+        Expense.group_id,
+        Group.name.label("group_name"),
+        Expense.description,
+        type_coerce(Expense.amount, BigInteger).label("amount"),
+        Expense.paid_by_id,
+        payer.name.label("paid_by_name"),
+        Expense.split_type,
+        ExpenseSplit.user_id,
+        member.name.label("user_name"),
+        type_coerce(ExpenseSplit.share_amount, BigInteger).label("share_amount"),
+        ExpenseSplit.percentage,
+    ).join(ExpenseSplit, ExpenseSplit.expense_id == Expense.id)\
+        .join(Group, Group.id == Expense.group_id)\
+        .join(payer, payer.id == Expense.paid_by_id)\
+        .join(member, member.id == ExpenseSplit.user_id)\
+        .order_by(Expense.id, ExpenseSplit.user_id)
+
+
+def group_export_query(group_id: int):
+    return export_query().where(Expense.group_id == group_id)
+
+
+def user_export_query(user_id: int):
+    """Every split of the expenses the user paid for or has a share in."""
+    involved = select(ExpenseSplit.expense_id).where(ExpenseSplit.user_id == user_id)
+    return export_query().where(or_(Expense.paid_by_id == user_id, Expense.id.in_(involved)))
+
+
+def cents_text(cents: int) -> str:
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def _batches(query):
+    """Yield lists of row tuples (in COLUMNS order) from a server-side cursor."""
+    db = SessionLocal()
+    try:
+        # Core execution on the session's connection skips ORM row processing
+        result = db.connection().execute(query.execution_options(yield_per=EXPORT_BATCH))
+        for batch in result.partitions():
+            yield batch
+    finally:
+        db.close()
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (expense_id, group_id, group_name, description, cents_text(amount), paid_by_id, paid_by_name,
+             split_type.value, user_id, user_name, cents_text(share_amount), percentage)
+            for (expense_id, group_id, group_name, description, amount, paid_by_id, paid_by_name,
+                 split_type, user_id, user_name, share_amount, percentage) in batch
+        )
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(batches):
+    for batch in batches:
+        lines = []
+        for row in batch:
+            item = dict(zip(COLUMNS, row))
+            item["split_type"] = item["split_type"].value
+            for column in MONEY_COLUMNS:
+                item[column] = item[column] / 100
+            lines.append(json.dumps(item))
+        yield "\n".join(lines) + "\n"
+
+
+class _ParquetSink:
+    """Write-only file object that hands written bytes back to the caller."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _pyarrow():
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+def _parquet_schema(pa):
+    money = pa.decimal128(18, 2)
+    return pa.schema([
+        ("expense_id", pa.int64()), ("group_id", pa.int64()), ("group_name", pa.string()),
+        ("description", pa.string()), ("amount", money), ("paid_by_id", pa.int64()),
+        ("paid_by_name", pa.string()), ("split_type", pa.string()), ("user_id", pa.int64()),
+        ("user_name", pa.string()), ("share_amount", money), ("percentage", pa.float64()),
+    ])
+
+
+def _parquet_chunks(batches):
+    pa, pq = _pyarrow()
+    schema = _parquet_schema(pa)
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in batches:
+        columns = dict(zip(COLUMNS, map(list, zip(*batch))))
+        columns["split_type"] = [split_type.value for split_type in columns["split_type"]]
+        for name in MONEY_COLUMNS:
+            columns[name] = [Decimal(cents).scaleb(-2) for cents in columns[name]]
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+FORMATS = {
+    ExportFormat.csv: ("text/csv; charset=utf-8", _csv_chunks),
+    ExportFormat.ndjson: ("application/x-ndjson", _ndjson_chunks),
+    ExportFormat.parquet: ("application/vnd.apache.parquet", _parquet_chunks),
+}
+
+
+def export_response(query, format: ExportFormat, filename: str) -> StreamingResponse:
+    """Stream the query's rows in the given format as a chunked download."""
+    if format == ExportFormat.parquet and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow (pip install pyarrow)")
+    media_type, encode = FORMATS[format]
+    return StreamingResponse(
+        encode(_batches(query)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format.value}"'},
+    )
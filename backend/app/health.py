@@ -0,0 +1,108 @@
+"""Startup warm-up and health probes.
+
+The app starts serving as soon as it is imported; nothing touches the
+database at import time. The lifespan handler in app.main runs `warm_up()`
+in the background instead:
+
+1. open DB_WARMUP_CONNECTIONS connections of the sync pool (default: the
+   pool size) and one of the async pool, retrying with backoff while the
+   database is unavailable;
+2. import the modules that are loaded lazily to keep startup fast (NumPy,
+   openai), so the first request does not pay for them. This is best
+   effort: a failure is logged and reported by /readyz, but does not keep
+   the app from becoming ready.
+
+`GET /healthz` (liveness) answers as long as the process serves requests.
+`GET /readyz` (readiness) answers 503 until the warm-up has finished and
+whenever the database does not respond.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from app.database import async_engine, engine, pool_sizes
+
+DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", "0")) or pool_sizes()["sync"][0]
+WARMUP_MAX_DELAY = 10.0
+
+log = logging.getLogger("app.health")
+
+
+class State:
+    def __init__(self):
+        self.ready = False
+        self.started_at = time.monotonic()
+        self.warmup_seconds = None
+        self.last_error = None
+
+
+state = State()
+
+
+def _warm_sync_pool():
+    # Hold the connections together so the pool really opens that many
+    connections = []
+    try:
+        for _ in range(max(1, DB_WARMUP_CONNECTIONS)):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+async def _warm_async_pool():
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+def _preload():
+    # Import only: building the client needs OPENAI_API_KEY, which the
+    # database endpoints don't
+    import openai  # noqa: F401
+
+    from app import api, balances  # noqa: F401  (NumPy)
+
+
+async def warm_up():
+    delay = 0.5
+    while True:
+        try:
+            await run_in_threadpool(_warm_sync_pool)
+            await _warm_async_pool()
+            break
+        except Exception as e:
+            state.last_error = str(e)
+            log.warning("database not reachable during warm-up, retrying in %.1fs: %s", delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_MAX_DELAY)
+    state.last_error = None
+    try:
+        await run_in_threadpool(_preload)
+    except Exception as e:
+        state.last_error = str(e)
+        log.warning("preloading lazy modules failed, they load on first use: %s", e)
+    state.warmup_seconds = round(time.monotonic() - state.started_at, 3)
+    state.ready = True
+    log.info("warm-up finished in %.3fs", state.warmup_seconds)
+
+
+def _ping():
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+async def readiness() -> dict:
+    """{"ready": bool, ...}; ready once warmed up and the database answers."""
+    if not state.ready:
+        return {"ready": False, "status": "warming up", "error": state.last_error}
+    try:
+        await run_in_threadpool(_ping)
+    except Exception as e:
+        return {"ready": False, "status": "database unavailable", "error": str(e)}
+    return {"ready": True, "status": "ok", "warmup_seconds": state.warmup_seconds, "error": state.last_error}
@@ -0,0 +1,99 @@
+"""Conditional GETs and a response cache for the group read endpoints.
+
+Every group has a `version` that is bumped in the same transaction as any
+write that changes what its read endpoints return (new groups start at 1).
+A response is identified by (route, version, params):
+
+- its strong ETag is a hash of that key, and a matching If-None-Match gets an
+  empty 304;
+- its JSON body is kept in a bounded cache (app.cache) under the same key, so
+  polling an unchanged group costs one primary-key lookup of its version.
+
+Nothing is invalidated explicitly: a write moves the version, so the old
+entries are never asked for again and age out of the LRU.
+"""
+import hashlib
+import os
+from typing import Any, Callable, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.cache import make_cache, make_key
+from app.models import Group
+
+# Separate from the chat cache settings; entries are keyed by version, so the
+# TTL only bounds how long unused bodies are kept
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory, sqlite or off
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+response_cache = make_cache(
+    "group_responses", RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAXSIZE, RESPONSE_CACHE_TTL
+)
+
+
+def bump_group_version(db: Session, group_id: int) -> int:
+    """Mark a group's cached responses stale; call inside the writing transaction.
+
+    Returns the new version.
+    """
+    return db.execute(
+        update(Group).where(Group.id == group_id).values(version=Group.version + 1).returning(Group.version)
+    ).scalar()
+
+
+def group_version(db: Session, group_id: int) -> Optional[int]:
+    """The group's version, or None if it does not exist."""
+    return db.query(Group.version).filter(Group.id == group_id).scalar()
+
+
+def groups_version(db: Session) -> str:
+    """A version for the list of all groups: changes when any group is added or bumped."""
+    count, total, last = db.query(
+        func.count(Group.id), func.coalesce(func.sum(Group.version), 0), func.coalesce(func.max(Group.id), 0)
+    ).one()
+    return f"{count}.{total}.{last}"
+
+
+def make_etag(*parts: Any) -> str:
+    return '"' + hashlib.sha1(make_key(*parts).encode()).hexdigest()[:24] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def cached_response(request: Request, route: str, version: Any, params: dict,
+                    compute: Callable[[], Any], current_version: Callable[[], Any]) -> Response:
+    """Serve a versioned response with an ETag, from the cache when possible.
+
+    compute() builds the response model on a miss. A write may commit while
+    it runs, so the body is only cached and tagged if current_version() still
+    equals version afterwards; otherwise it is sent untagged.
+
+    X-Version exposes the version itself; for a single group it matches the
+    ids of the group's live events (app.events).
+    """
+    etag = make_etag(route, version, params)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Version": str(version)}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    key = make_key(route, version, params)
+    body = response_cache.get(key)
+    if body is None:
+        body = jsonable_encoder(compute())
+        if current_version() != version:
+            return JSONResponse(body)
+        response_cache.set(key, body)
+    return JSONResponse(body, headers=headers)
@@ -0,0 +1,112 @@
+"""Idempotency-Key support for writes that clients may retry.
+
+A client sends a unique `Idempotency-Key` header with a write. The response
+is stored under that key in the same transaction as the write, so the write
+and its key commit or roll back together:
+
+- a retry with the same key and the same request gets the stored response
+  (with `Idempotent-Replayed: true`) and writes nothing;
+- the same key with a different request is rejected with 422;
+- when two attempts race, the second fails on the key's primary key at
+  commit, rolls back its write and replays the first one's response.
+
+Keys expire after IDEMPOTENCY_TTL_HOURS. Expired keys are purged at most
+every PURGE_INTERVAL seconds per process after a keyed write, or with
+`python -m app.idempotency purge`.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+from app.cache import make_key
+from app.models import IdempotencyKey, utcnow
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+PURGE_INTERVAL = 600
+MAX_KEY_LENGTH = 255
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def expiry_cutoff() -> datetime:
+    return utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+
+
+def fingerprint(*parts: Any) -> str:
+    """Hash of the request a key was first used with."""
+    return hashlib.sha256(make_key(*jsonable_encoder(parts)).encode()).hexdigest()
+
+
+def lookup(db: Session, key: str, request_hash: str) -> Optional[JSONResponse]:
+    """The stored response for key, or None if the key is new (or expired)."""
+    row = db.get(IdempotencyKey, key)
+    if row is None:
+        return None
+    if row.created_at < expiry_cutoff():
+        db.delete(row)
+        db.flush()
+        return None
+    if row.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    return JSONResponse(json.loads(row.response), status_code=row.status_code,
+                        headers={"Idempotent-Replayed": "true"})
+
+
+def record(db: Session, key: str, request_hash: str, status_code: int, body: Any):
+    """Store the response of a keyed write; call before the write commits."""
+    db.add(IdempotencyKey(
+        key=key,
+        request_hash=request_hash,
+        status_code=status_code,
+        response=json.dumps(jsonable_encoder(body)),
+        created_at=utcnow(),
+    ))
+
+
+def purge(db: Session) -> int:
+    """Delete expired keys. Returns the number deleted."""
+    deleted = db.query(IdempotencyKey).filter(IdempotencyKey.created_at < expiry_cutoff())\
+        .delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+def maybe_purge(db: Session):
+    """Purge expired keys if this process has not done so for PURGE_INTERVAL seconds."""
+    global _last_purge
+    with _purge_lock:
+        if time.monotonic() - _last_purge < PURGE_INTERVAL:
+            return
+        _last_purge = time.monotonic()
+    purge(db)
+
+
+def main(argv=None):
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Delete expired idempotency keys.")
+    parser.add_argument("command", choices=["purge"])
+    parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        print(f"Purged {purge(db)} expired idempotency keys")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Rule-based intent parser for /chat.
+
+Handles the common phrasings of the three chat intents locally, resolving
+user and group names against an in-memory index of `User.name` and
+`Group.name`. `parse` returns None when it is not confident, in which case the
+caller falls back to the LLM parser.
+"""
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Group, User
+
+# Below this confidence the query is handed to the LLM
+CONFIDENCE_THRESHOLD = 0.8
+
+# Reload names at least this often so other workers' inserts show up
+INDEX_TTL_SECONDS = 30.0
+
+_TOKEN = re.compile(r"\w+")
+_SELF = re.compile(r"\b(i|me|my|mine|myself)\b")
+_TOP_PAYER = re.compile(
+    r"\bwho\b.*\b(paid|pays|spent|spends|paying|spending)\b.*\b(most|highest|biggest|more)\b"
+    r"|\b(top|biggest|largest|highest)\s+(payer|spender|contributor)\b"
+)
+_EXPENSES = re.compile(r"\b(expenses?|purchases?|payments?|transactions?|spending|spent)\b")
+_BALANCE = re.compile(r"\b(owe|owes|owed|owing|balance|balances|due|debt|debts|net)\b")
+_WORD_NUMBERS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_COUNT = re.compile(r"\b(\d+|" + "|".join(_WORD_NUMBERS) + r")\b")
+
+REQUIRED_ENTITIES = {
+    "get_user_balance": ("user_name",),
+    "get_user_expenses": ("user_name",),
+    "get_top_payer": ("group_name",),
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class NameIndex:
+    """Token n-gram lookup of user and group names."""
+
+    def __init__(self):
+        self.users: Dict[Tuple[str, ...], str] = {}
+        self.groups: Dict[Tuple[str, ...], str] = {}
+        self.max_tokens = 1
+        self.loaded_at: Optional[float] = None
+
+    def load(self, user_names, group_names):
+        self.users = {tuple(tokenize(name)): name for name in user_names if tokenize(name)}
+        self.groups = {tuple(tokenize(name)): name for name in group_names if tokenize(name)}
+        self.max_tokens = max((len(key) for key in (*self.users, *self.groups)), default=1)
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > INDEX_TTL_SECONDS
+
+    async def refresh(self, db: AsyncSession):
+        if self.is_stale():
+            user_names = (await db.execute(select(User.name))).scalars().all()
+            group_names = (await db.execute(select(Group.name))).scalars().all()
+            self.load(user_names, group_names)
+
+    def find(self, tokens: List[str]):
+        """Return (user names, group names) mentioned in the tokens, longest match first."""
+        users, groups = [], []
+        i = 0
+        while i < len(tokens):
+            for size in range(min(self.max_tokens, len(tokens) - i), 0, -1):
+                key = tuple(tokens[i:i + size])
+                if key in self.groups or key in self.users:
+                    if key in self.groups:
+                        groups.append(self.groups[key])
+                    if key in self.users:
+                        users.append(self.users[key])
+                    i += size
+                    break
+            else:
+                i += 1
+        return users, groups
+
+
+name_index = NameIndex()
+
+
+def parse(query: str, current_user_name: str = None, index: NameIndex = name_index) -> Optional[dict]:
+    """Parse a chat query into the same shape the LLM parser returns.
+
+    Returns None when the local rules are not confident enough.
+    """
+    text = query.lower()
+    matched = [
+        intent for intent, pattern in (
+            ("get_top_payer", _TOP_PAYER),
+            ("get_user_expenses", _EXPENSES),
+            ("get_user_balance", _BALANCE),
+        )
+        if pattern.search(text)
+    ]
+    if not matched:
+        return None
+    # Top payer questions also mention paying/spending, so it wins over expenses
+    intent = matched[0]
+    confidence = 1.0 if len(matched) == 1 or intent == "get_top_payer" else 0.6
+
+    users, groups = index.find(tokenize(query))
+    if current_user_name and _SELF.search(text):
+        users.insert(0, current_user_name)
+    users = list(dict.fromkeys(users))
+    groups = list(dict.fromkeys(groups))
+    # A name shared by a user and a group is taken as the group when another user is named
+    if len(users) > 1:
+        users = [u for u in users if u not in groups] or users
+
+    parsed = {"intent": intent}
+    if intent in ("get_user_balance", "get_user_expenses"):
+        if len(users) > 1:
+            confidence -= 0.3
+        if users:
+            parsed["user_name"] = users[0]
+    if intent in ("get_user_balance", "get_top_payer"):
+        if len(groups) > 1:
+            confidence -= 0.3
+        if groups:
+            parsed["group_name"] = groups[0]
+    if intent == "get_user_expenses":
+        count = _COUNT.search(text)
+        if count:
+            value = count.group(1)
+            parsed["num_expenses"] = int(value) if value.isdigit() else _WORD_NUMBERS[value]
+
+    if any(entity not in parsed for entity in REQUIRED_ENTITIES[intent]):
+        confidence -= 0.5
+    parsed["confidence"] = round(confidence, 2)
+    return parsed if confidence >= CONFIDENCE_THRESHOLD else None
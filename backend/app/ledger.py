@@ -0,0 +1,231 @@
+"""Materialized per-group balance ledger.
+
+`group_balances` holds one row per (group, user) with the user's net balance
+in that group (total paid minus total owed). The ledger is updated in the same
+transaction as the expense splits, so the balance endpoints can read it
+directly instead of walking every expense.
+
+`pairwise_debts` breaks those balances down by counterparty: for each pair of
+users in a group, the net amount one owes the other (every split share of a
+user other than the payer is a debt to the payer). It is updated in the same
+transaction, so a user's debts read k rows, one per counterparty and group.
+
+Run `python -m app.ledger verify` to report drift between both tables and the
+expense tables, or `python -m app.ledger rebuild` to recompute them.
+"""
+import argparse
+import sys
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import BigInteger, case, select, type_coerce
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.models import Expense, ExpenseSplit, GroupBalance, PairwiseDebt
+from app.money import from_cents
+
+# INSERT ... ON CONFLICT for the supported databases
+_INSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert_add(db: Session, model, keys: List[str], rows: List[dict]):
+    """Add the non-key values of rows onto the rows with the same keys, creating missing ones.
+
+    One executemany `INSERT ... ON CONFLICT DO UPDATE SET col = col +
+    excluded.col` per call, however many rows change: concurrent writers
+    never overwrite each other, and two writers creating the same row
+    cannot collide on its primary key. Rows are written in key order so
+    concurrent transactions lock them in the same order.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    statement = _INSERT[db.get_bind().dialect.name](table)
+    columns = [column for column in rows[0] if column not in keys]
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: table.c[column] + statement.excluded[column] for column in columns},
+        ),
+        sorted(rows, key=lambda row: [row[key] for key in keys]),
+    )
+
+
+def init_members(db: Session, group_id: int, user_ids: Iterable[int]):
+    """Add zero-balance ledger rows for new group members."""
+    for user_id in user_ids:
+        db.add(GroupBalance(group_id=group_id, user_id=user_id, net_balance=0))
+
+
+def expense_deltas(paid_by_id: int, amount: Decimal, shares: Iterable[Tuple[int, Decimal]]) -> Dict[int, Decimal]:
+    """Net balance change per user caused by a single expense."""
+    deltas = defaultdict(Decimal)
+    deltas[paid_by_id] += amount
+    for user_id, share_amount in shares:
+        deltas[user_id] -= share_amount
+    return dict(deltas)
+
+
+def apply_deltas(db: Session, group_id: int, deltas: Dict[int, Decimal]):
+    """Add deltas to the ledger rows of a group.
+
+    A single upsert statement (see `upsert_add`). Rows missing from the
+    ledger (e.g. a payer who is not a group member) are created on demand.
+    """
+    upsert_add(db, GroupBalance, ["group_id", "user_id"], [
+        {"group_id": group_id, "user_id": user_id, "net_balance": delta}
+        for user_id, delta in deltas.items()
+    ])
+
+
+Pair = Tuple[int, int]
+
+
+def pair_deltas(paid_by_id: int, shares: Iterable[Tuple[int, Decimal]]) -> Dict[Pair, Decimal]:
+    """Pairwise debt change per (user_id, other_user_id) pair caused by a single expense."""
+    deltas = defaultdict(Decimal)
+    for user_id, share_amount in shares:
+        if user_id == paid_by_id or not share_amount:
+            continue
+        if user_id < paid_by_id:
+            deltas[(user_id, paid_by_id)] += share_amount
+        else:
+            deltas[(paid_by_id, user_id)] -= share_amount
+    return dict(deltas)
+
+
+def apply_pair_deltas(db: Session, group_id: int, deltas: Dict[Pair, Decimal]):
+    """Add deltas to the pairwise debts of a group in one upsert statement, creating missing pairs."""
+    upsert_add(db, PairwiseDebt, ["group_id", "user_id", "other_user_id"], [
+        {"group_id": group_id, "user_id": user_id, "other_user_id": other_user_id, "amount": delta}
+        for (user_id, other_user_id), delta in deltas.items()
+    ])
+
+
+def apply_expense(db: Session, expense: Expense, shares: Iterable[Tuple[int, Decimal]]) -> Dict[int, Decimal]:
+    """Record an expense and its (user_id, share_amount) splits in the ledger; returns the balance deltas."""
+    shares = list(shares)
+    deltas = expense_deltas(expense.paid_by_id, expense.amount, shares)
+    apply_deltas(db, expense.group_id, deltas)
+    apply_pair_deltas(db, expense.group_id, pair_deltas(expense.paid_by_id, shares))
+    return deltas
+
+
+def compute_balances(db: Session) -> Dict[Tuple[int, int], Decimal]:
+    """Recompute every (group_id, user_id) net balance from Expense/ExpenseSplit."""
+    from app import balances  # NumPy is only needed here, not at app startup
+
+    return {key: from_cents(cents) for key, cents in balances.from_expenses(db).to_dict().items()}
+
+
+def verify_ledger(db: Session) -> List[dict]:
+    """Compare the ledger with a fresh recomputation and return drifted rows."""
+    expected = compute_balances(db)
+    stored = {
+        (row.group_id, row.user_id): row.net_balance
+        for row in db.query(GroupBalance)
+    }
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        want = expected.get(key, Decimal(0))
+        have = stored.get(key)
+        # Amounts are exact integer cents, so any difference is real drift
+        if have != want:
+            drift.append({
+                "group_id": key[0],
+                "user_id": key[1],
+                "expected": want,
+                "stored": have,
+            })
+    return drift
+
+
+def compute_pairwise(db: Session) -> Dict[Tuple[int, int, int], Decimal]:
+    """Recompute every non-zero (group_id, user_id, other_user_id) debt from the expense tables."""
+    lower = ExpenseSplit.user_id < Expense.paid_by_id
+    user_id = case((lower, ExpenseSplit.user_id), else_=Expense.paid_by_id)
+    other_user_id = case((lower, Expense.paid_by_id), else_=ExpenseSplit.user_id)
+    share = type_coerce(ExpenseSplit.share_amount, BigInteger)
+    rows = db.execute(
+        select(Expense.group_id, user_id, other_user_id, func.sum(case((lower, share), else_=-share)))
+        .join(Expense, Expense.id == ExpenseSplit.expense_id)
+        .where(ExpenseSplit.user_id != Expense.paid_by_id)
+        .group_by(Expense.group_id, user_id, other_user_id)
+    )
+    return {
+        (group_id, user_id, other_user_id): from_cents(cents)
+        for group_id, user_id, other_user_id, cents in rows if cents
+    }
+
+
+def verify_pairwise(db: Session) -> List[dict]:
+    """Compare pairwise_debts with a fresh recomputation and return drifted pairs."""
+    expected = compute_pairwise(db)
+    stored = {
+        (row.group_id, row.user_id, row.other_user_id): row.amount
+        for row in db.query(PairwiseDebt)
+    }
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        want = expected.get(key, Decimal(0))
+        have = stored.get(key, Decimal(0))
+        if have != want:
+            drift.append({
+                "group_id": key[0],
+                "user_id": key[1],
+                "other_user_id": key[2],
+                "expected": want,
+                "stored": have,
+            })
+    return drift
+
+
+def rebuild_ledger(db: Session) -> int:
+    """Replace the ledger and pairwise debt contents with a fresh recomputation. Returns row count."""
+    expected = compute_balances(db)
+    pairwise = compute_pairwise(db)
+    db.query(GroupBalance).delete()
+    db.query(PairwiseDebt).delete()
+    db.add_all(
+        GroupBalance(group_id=group_id, user_id=user_id, net_balance=net_balance)
+        for (group_id, user_id), net_balance in expected.items()
+    )
+    db.add_all(
+        PairwiseDebt(group_id=group_id, user_id=user_id, other_user_id=other_user_id, amount=amount)
+        for (group_id, user_id, other_user_id), amount in pairwise.items()
+    )
+    db.commit()
+    return len(expected) + len(pairwise)
+
+
+def main(argv=None):
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Verify or rebuild the group balance ledger and pairwise debts.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt ledger: {rebuild_ledger(db)} rows")
+            return 0
+        drift = verify_ledger(db)
+        for row in drift:
+            print(f"group={row['group_id']} user={row['user_id']} "
+                  f"expected={row['expected']:.2f} stored={row['stored']}")
+        pair_drift = verify_pairwise(db)
+        for row in pair_drift:
+            print(f"group={row['group_id']} pair={row['user_id']}->{row['other_user_id']} "
+                  f"expected={row['expected']:.2f} stored={row['stored']:.2f}")
+        print(f"{len(drift)} drifted rows, {len(pair_drift)} drifted pairs")
+        return 1 if drift or pair_drift else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
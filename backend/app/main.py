@@ -1,19 +1,25 @@
-from dotenv import load_dotenv
-import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app import health, metrics
 from app.api import router
-from app.database import Base, engine
+from app.database import async_engine, engine
 
-# Load environment variables from .env file
- # Point to backend/app/.env
-load_dotenv()
+# backend/.env is loaded once in app/__init__.py, before the settings are read
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so a briefly unavailable database delays
+    # readiness instead of failing startup (see app/health.py)
+    warmup = asyncio.create_task(health.warm_up())
+    yield
+    warmup.cancel()
+    await async_engine.dispose()
+    engine.dispose()
 
-app = FastAPI(title="Splitwise Clone API")
-openai_api_key = os.getenv("OPENAI_API_KEY")
+app = FastAPI(title="Splitwise Clone API", lifespan=lifespan)
 
 # Allow CORS for frontend communication (localhost:3000 for React)
 app.add_middleware(
@@ -22,11 +28,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Version", "Idempotent-Replayed"],
 )
 
+# Per-route latency, SQL and LLM metrics (see app/metrics.py)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
 # Include API routes
 app.include_router(router)
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Liveness: the process is serving requests
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    return {"status": "ok"}
+
+# Readiness: warmed up and the database answers
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    result = await health.readiness()
+    return JSONResponse(result, status_code=200 if result["ready"] else 503)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    from app.database import WEB_CONCURRENCY
+    # Each worker is a separate process with its own connection pools (see app/database.py)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, workers=WEB_CONCURRENCY)
\ No newline at end of file
@@ -0,0 +1,260 @@
+"""Request-level performance instrumentation.
+
+- `MetricsMiddleware` (ASGI) times every request per route and collects the
+  SQL statements and LLM calls made while serving it.
+- SQLAlchemy engine events count statements and their execution time; with
+  SLOW_QUERY_MS set, statements slower than that are logged (with the route)
+  to the "app.slow_query" logger.
+- `llm_call()` wraps OpenAI calls to record latency and token usage.
+- `render()` returns everything in the Prometheus text format for /metrics.
+  With METRICS_SERVER_TIMING=true responses also carry a Server-Timing
+  header (app, db and llm durations).
+
+Metrics are kept in memory per process, so with several uvicorn workers each
+scrape sees only the worker that answered it.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+slow_query_log = logging.getLogger("app.slow_query")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        for key, counts, total, count in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_labels(key + (('le', _number(bound)),))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {count}"
+            yield f"{self.name}_sum{_labels(key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(key)} {count}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(key)} {_number(value)}"
+
+
+def _labels(key: Labels) -> str:
+    if not key:
+        return ""
+    pairs = []
+    for name, value in key:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route.", LATENCY_BUCKETS)
+request_statements = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request, by route.", COUNT_BUCKETS)
+request_db_seconds = Histogram(
+    "http_request_db_seconds", "Total SQL execution time per request, by route.", LATENCY_BUCKETS)
+sql_statements = Counter("db_statements_total", "SQL statements executed, by route.")
+sql_seconds = Counter("db_statement_seconds_total", "Time spent executing SQL statements, by route.")
+slow_statements = Counter("db_slow_statements_total", "SQL statements slower than SLOW_QUERY_MS, by route.")
+llm_duration = Histogram(
+    "llm_request_duration_seconds", "OpenAI call latency, by operation and outcome.", LATENCY_BUCKETS)
+llm_tokens = Counter("llm_tokens_total", "OpenAI tokens used, by operation and kind (prompt or completion).")
+events_delivered = Counter("group_events_delivered_total", "Group events handed to subscriber queues.")
+event_overflows = Counter(
+    "group_event_overflows_total", "Subscriber queues that overflowed and were replaced with a resync event.")
+
+REGISTRY = [
+    request_duration, request_statements, request_db_seconds,
+    sql_statements, sql_seconds, slow_statements, llm_duration, llm_tokens,
+    events_delivered, event_overflows,
+]
+
+
+class RequestStats:
+    """Mutable per-request totals; shared with threadpool workers via the context."""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.llm_count = 0
+        self.llm_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # FastAPI stores the matched route in the scope once routing is done
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# SQL statement timing
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    route = stats.route if stats else "none"
+    if stats:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+    sql_statements.inc(route=route)
+    sql_seconds.inc(elapsed, route=route)
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_statements.inc(route=route)
+        slow_query_log.warning("%.1f ms on %s: %s params=%.500r", elapsed * 1000, route, statement, parameters)
+
+
+def _handle_error(context):
+    # after_cursor_execute is skipped for failed statements
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+
+def instrument_engine(engine):
+    """Attach statement timing to a sync Engine (use async_engine.sync_engine for async)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+# LLM calls
+
+class _LLMCall:
+    def __init__(self):
+        self.usage = None
+
+    def record_usage(self, usage):
+        self.usage = usage
+
+
+@contextmanager
+def llm_call(operation: str):
+    """Time an OpenAI call; call .record_usage(response.usage) inside the block."""
+    call = _LLMCall()
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield call
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        llm_duration.observe(elapsed, operation=operation, outcome=outcome)
+        stats = current_request.get()
+        if stats:
+            stats.llm_count += 1
+            stats.llm_seconds += elapsed
+        if call.usage is not None:
+            llm_tokens.inc(getattr(call.usage, "prompt_tokens", 0) or 0, operation=operation, kind="prompt")
+            llm_tokens.inc(getattr(call.usage, "completion_tokens", 0) or 0, operation=operation, kind="completion")
+
+
+# Middleware
+
+def server_timing(stats: RequestStats, elapsed: float) -> str:
+    parts = [f"app;dur={elapsed * 1000:.1f}",
+             f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.sql_count} queries"']
+    if stats.llm_count:
+        parts.append(f'llm;dur={stats.llm_seconds * 1000:.1f};desc="{stats.llm_count} calls"')
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed until their last chunk."""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                if self.server_timing:
+                    header = server_timing(stats, time.perf_counter() - start).encode("latin-1")
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            labels = {"method": scope["method"], "route": stats.route}
+            request_duration.observe(time.perf_counter() - start, status=status, **labels)
+            request_statements.observe(stats.sql_count, **labels)
+            request_db_seconds.observe(stats.sql_seconds, **labels)
+            current_request.reset(token)
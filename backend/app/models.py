@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Enum
+from sqlalchemy import Column, Date, DateTime, Integer, String, Float, ForeignKey, Enum, Index, Text
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 from app.database import Base
+from app.money import Cents
+from datetime import datetime, timezone
 import enum
 
+def utcnow() -> datetime:
+    """Naive UTC, as stored in the DateTime columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 # Enum for split type
 class SplitType(str, enum.Enum):
     equal = "equal"
@@ -15,13 +22,20 @@ class User(Base):
     group_members = relationship("GroupMember", back_populates="user")
     expenses_paid = relationship("Expense", back_populates="paid_by")
     expense_splits = relationship("ExpenseSplit", back_populates="user")
+    group_balances = relationship("GroupBalance", back_populates="user")
+    # Case-insensitive name lookups from /chat
+    __table_args__ = (Index("ix_users_name_lower", func.lower(name)),)
 
 class Group(Base):
     __tablename__ = "groups"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
+    # Bumped by every write that changes the group's read endpoints (ETags, response cache)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     members = relationship("GroupMember", back_populates="group")
     expenses = relationship("Expense", back_populates="group")
+    balances = relationship("GroupBalance", back_populates="group")
+    __table_args__ = (Index("ix_groups_name_lower", func.lower(name)),)
 
 class GroupMember(Base):
     __tablename__ = "group_members"
@@ -29,24 +43,89 @@ class GroupMember(Base):
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     group = relationship("Group", back_populates="members")
     user = relationship("User", back_populates="group_members")
+    __table_args__ = (Index("ix_group_members_user_id", "user_id"),)
 
 class Expense(Base):
     __tablename__ = "expenses"
     id = Column(Integer, primary_key=True, index=True)
     group_id = Column(Integer, ForeignKey("groups.id"))
     description = Column(String, nullable=False)
-    amount = Column(Float, nullable=False)
+    amount = Column(Cents, nullable=False)  # Stored as integer cents
     paid_by_id = Column(Integer, ForeignKey("users.id"))
     split_type = Column(Enum(SplitType), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=utcnow)  # UTC
     group = relationship("Group", back_populates="expenses")
     paid_by = relationship("User", back_populates="expenses_paid")
     splits = relationship("ExpenseSplit", back_populates="expense")
+    # Keyset pagination of expense listings per group and per payer
+    __table_args__ = (
+        Index("ix_expenses_group_id_id", "group_id", "id"),
+        Index("ix_expenses_paid_by_id_id", "paid_by_id", "id"),
+    )
 
 class ExpenseSplit(Base):
     __tablename__ = "expense_splits"
     expense_id = Column(Integer, ForeignKey("expenses.id"), primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
-    share_amount = Column(Float, nullable=False)
+    share_amount = Column(Cents, nullable=False)
     percentage = Column(Float, nullable=True)  # Only for percentage splits
     expense = relationship("Expense", back_populates="splits")
-    user = relationship("User", back_populates="expense_splits")
\ No newline at end of file
+    user = relationship("User", back_populates="expense_splits")
+    __table_args__ = (Index("ix_expense_splits_user_id", "user_id", "expense_id"),)
+
+# Materialized net balance per (group, user), maintained by app.ledger
+class GroupBalance(Base):
+    __tablename__ = "group_balances"
+    group_id = Column(Integer, ForeignKey("groups.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    net_balance = Column(Cents, nullable=False, default=0)
+    group = relationship("Group", back_populates="balances")
+    user = relationship("User", back_populates="group_balances")
+# Net debt between two users in a group, maintained by app.ledger. Each pair is
+# stored once with user_id < other_user_id: a positive amount means user_id
+# owes other_user_id, a negative one that other_user_id owes user_id.
+class PairwiseDebt(Base):
+    __tablename__ = "pairwise_debts"
+    group_id = Column(Integer, ForeignKey("groups.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    other_user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    amount = Column(Cents, nullable=False, default=0)
+    # All debts of one user (on either side of the pair), and of one pair across groups
+    __table_args__ = (
+        Index("ix_pairwise_debts_user_id", "user_id", "other_user_id"),
+        Index("ix_pairwise_debts_other_user_id", "other_user_id", "user_id"),
+    )
+
+# Stored responses of writes made with an Idempotency-Key, see app.idempotency
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(Text, nullable=False)  # JSON body
+    created_at = Column(DateTime, nullable=False)  # UTC
+    # Expired keys are purged by age
+    __table_args__ = (Index("ix_idempotency_keys_created_at", "created_at"),)
+
+# Spend per (group, period, user), maintained by app.rollups on every expense
+# insert: what the user paid, for how many expenses, and their split shares.
+# period is the UTC day, or the first day of the UTC month.
+class ExpenseRollupDaily(Base):
+    __tablename__ = "expense_rollups_daily"
+    group_id = Column(Integer, ForeignKey("groups.id"), primary_key=True)
+    period = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    paid = Column(Cents, nullable=False, default=0)
+    paid_count = Column(Integer, nullable=False, default=0)
+    owed = Column(Cents, nullable=False, default=0)
+
+class ExpenseRollupMonthly(Base):
+    __tablename__ = "expense_rollups_monthly"
+    group_id = Column(Integer, ForeignKey("groups.id"), primary_key=True)
+    period = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    paid = Column(Cents, nullable=False, default=0)
+    paid_count = Column(Integer, nullable=False, default=0)
+    owed = Column(Cents, nullable=False, default=0)
+    # Chat intents read a user's totals across groups
+    __table_args__ = (Index("ix_expense_rollups_monthly_user_id", "user_id", "group_id"),)
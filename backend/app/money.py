@@ -0,0 +1,71 @@
+"""Exact money handling.
+
+Amounts are stored as integer cents (BIGINT) and handled in Python as
+`Decimal` values with two decimal places, so sums in SQL are pure integer
+aggregation and no binary floating point drift builds up.
+
+- `Cents`: SQLAlchemy column type, Decimal in Python, integer cents in the DB.
+- `Money`: Pydantic field type, Decimal that serializes as a JSON number.
+- `allocate`: split an amount into shares that always sum exactly to it.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+from fractions import Fraction
+from typing import Annotated, List, Sequence, Union
+
+from pydantic import PlainSerializer
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
+
+CENT = Decimal("0.01")
+
+Number = Union[Decimal, float, int, str]
+
+
+def to_cents(amount: Number) -> int:
+    """Convert an amount to integer cents, rounding half up."""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> Decimal:
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+def allocate(total_cents: int, weights: Sequence[Number]) -> List[int]:
+    """Split total_cents in proportion to weights using largest remainders.
+
+    Every share is the floor of its exact proportional value; the cents left
+    over go one each to the shares with the largest fractional parts (ties
+    to the earlier share). The result always sums to total_cents.
+    """
+    exact_weights = [Fraction(Decimal(str(w))) for w in weights]
+    weight_sum = sum(exact_weights)
+    if weight_sum == 0:
+        raise ValueError("Cannot allocate over zero total weight")
+    exact = [total_cents * w / weight_sum for w in exact_weights]
+    shares = [int(x // 1) for x in exact]
+    leftover = total_cents - sum(shares)
+    by_remainder = sorted(range(len(exact)), key=lambda i: (-(exact[i] - shares[i]), i))
+    for i in by_remainder[:leftover]:
+        shares[i] += 1
+    return shares
+
+
+class Cents(TypeDecorator):
+    """Decimal amount stored as integer cents."""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_cents(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return from_cents(int(value))
+
+
+# JSON numbers keep the API backwards compatible; Python code sees Decimal
+Money = Annotated[Decimal, PlainSerializer(float, return_type=float, when_used="json")]
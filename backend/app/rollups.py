@@ -0,0 +1,206 @@
+"""Pre-aggregated expense rollups for time-ranged analytics.
+
+`expense_rollups_daily` and `expense_rollups_monthly` hold one row per
+(group, period, user): what the user paid, for how many expenses, and the sum
+of their split shares, bucketed by the expense's UTC `created_at`. Both are
+updated in the same transaction as the expense, so `GET /groups/{id}/stats`
+and the chat intents read a few rows per period instead of every expense.
+
+A range is answered from whole months of the monthly table plus the partial
+months at either end from the daily table (see `segments`).
+
+Run `python -m app.rollups verify` to report drift against the expense
+tables, or `python -m app.rollups rebuild` to recompute both tables.
+"""
+import argparse
+import enum
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.ledger import upsert_add
+from app.models import Expense, ExpenseRollupDaily, ExpenseRollupMonthly, ExpenseSplit
+from app.money import from_cents, to_cents
+
+ROLLUPS = (ExpenseRollupDaily, ExpenseRollupMonthly)
+
+
+class Granularity(str, enum.Enum):
+    day = "day"
+    month = "month"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(day: date) -> date:
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+class RollupDeltas:
+    """[paid cents, expense count, owed cents] per (group_id, day, user_id), folded into months on apply."""
+
+    def __init__(self):
+        self.days = defaultdict(lambda: [0, 0, 0])
+
+    def add_expense(self, group_id: int, created_at: datetime, paid_by_id: int, amount: Decimal,
+                    shares: Iterable[Tuple[int, Decimal]]):
+        day = created_at.date()
+        payer = self.days[(group_id, day, paid_by_id)]
+        payer[0] += to_cents(amount)
+        payer[1] += 1
+        for user_id, share_amount in shares:
+            self.days[(group_id, day, user_id)][2] += to_cents(share_amount)
+
+    def months(self) -> Dict[Tuple[int, date, int], list]:
+        months = defaultdict(lambda: [0, 0, 0])
+        for (group_id, day, user_id), (paid, count, owed) in self.days.items():
+            entry = months[(group_id, month_start(day), user_id)]
+            entry[0] += paid
+            entry[1] += count
+            entry[2] += owed
+        return months
+
+
+def _rows(totals: Dict[Tuple[int, date, int], list]) -> List[dict]:
+    return [
+        {"group_id": group_id, "period": period, "user_id": user_id,
+         "paid": from_cents(paid), "paid_count": count, "owed": from_cents(owed)}
+        for (group_id, period, user_id), (paid, count, owed) in sorted(totals.items())
+    ]
+
+
+def apply(db: Session, deltas: RollupDeltas):
+    """Add the deltas of one or more expenses to the daily and monthly rollups, one upsert per table."""
+    keys = ["group_id", "period", "user_id"]
+    upsert_add(db, ExpenseRollupDaily, keys, _rows(deltas.days))
+    upsert_add(db, ExpenseRollupMonthly, keys, _rows(deltas.months()))
+
+
+def apply_expense(db: Session, expense: Expense, shares: Iterable[Tuple[int, Decimal]]):
+    """Record an expense and its (user_id, share_amount) splits in the rollups."""
+    deltas = RollupDeltas()
+    deltas.add_expense(expense.group_id, expense.created_at, expense.paid_by_id, expense.amount, shares)
+    apply(db, deltas)
+
+
+def segments(start: Optional[date], end: Optional[date], granularity: Granularity):
+    """(model, first period, last period) covering the days start..end (inclusive, None: unbounded).
+
+    Day series read the daily table only. Otherwise the whole months inside
+    the range come from the monthly table and the partial months at either
+    end from the daily table, so at most three ranges are read.
+    """
+    if granularity == Granularity.day:
+        return [(ExpenseRollupDaily, start, end)]
+    # First and last day covered by whole months
+    first = start if start is None or start.day == 1 else next_month(start)
+    last = end if end is None or next_month(end) - timedelta(days=1) == end else month_start(end) - timedelta(days=1)
+    if first is not None and last is not None and first > last:
+        return [(ExpenseRollupDaily, start, end)]
+    result = []
+    if first != start:
+        result.append((ExpenseRollupDaily, start, first - timedelta(days=1)))
+    result.append((ExpenseRollupMonthly, first, last and month_start(last)))
+    if last != end:
+        result.append((ExpenseRollupDaily, month_start(end), end))
+    return result
+
+
+def in_range(model, start: Optional[date], end: Optional[date]):
+    conditions = []
+    if start is not None:
+        conditions.append(model.period >= start)
+    if end is not None:
+        conditions.append(model.period <= end)
+    return conditions
+
+
+def compute_rollups(db: Session) -> RollupDeltas:
+    """Recompute every rollup from Expense/ExpenseSplit, streaming both tables."""
+    totals = RollupDeltas()
+    for group_id, created_at, paid_by_id, amount in db.execute(
+        select(Expense.group_id, Expense.created_at, Expense.paid_by_id, Expense.amount)
+        .execution_options(yield_per=10000)
+    ):
+        totals.add_expense(group_id, created_at, paid_by_id, amount, ())
+    for group_id, created_at, user_id, share_amount in db.execute(
+        select(Expense.group_id, Expense.created_at, ExpenseSplit.user_id, ExpenseSplit.share_amount)
+        .join(Expense, Expense.id == ExpenseSplit.expense_id)
+        .execution_options(yield_per=10000)
+    ):
+        totals.days[(group_id, created_at.date(), user_id)][2] += to_cents(share_amount)
+    return totals
+
+
+def _stored(db: Session, model) -> Dict[Tuple[int, date, int], list]:
+    return {
+        (row.group_id, row.period, row.user_id): [to_cents(row.paid), row.paid_count, to_cents(row.owed)]
+        for row in db.query(model)
+    }
+
+
+def verify_rollups(db: Session) -> List[dict]:
+    """Compare both rollup tables with a fresh recomputation and return drifted rows."""
+    expected = compute_rollups(db)
+    drift = []
+    for model, want_rows in ((ExpenseRollupDaily, expected.days), (ExpenseRollupMonthly, expected.months())):
+        stored = _stored(db, model)
+        for key in sorted(set(want_rows) | set(stored)):
+            want = list(want_rows.get(key, [0, 0, 0]))
+            have = stored.get(key)
+            if have != want:
+                drift.append({
+                    "table": model.__tablename__,
+                    "group_id": key[0],
+                    "period": key[1],
+                    "user_id": key[2],
+                    "expected": want,
+                    "stored": have,
+                })
+    return drift
+
+
+def rebuild_rollups(db: Session) -> int:
+    """Replace both rollup tables with a fresh recomputation. Returns row count."""
+    expected = compute_rollups(db)
+    for model in ROLLUPS:
+        db.query(model).delete()
+    daily, monthly = _rows(expected.days), _rows(expected.months())
+    for model, rows in ((ExpenseRollupDaily, daily), (ExpenseRollupMonthly, monthly)):
+        if rows:
+            db.execute(model.__table__.insert(), rows)
+    db.commit()
+    return len(daily) + len(monthly)
+
+
+def main(argv=None):
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Verify or rebuild the daily and monthly expense rollups.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt rollups: {rebuild_rollups(db)} rows")
+            return 0
+        drift = verify_rollups(db)
+        for row in drift:
+            print(f"{row['table']} group={row['group_id']} period={row['period']} user={row['user_id']} "
+                  f"expected={row['expected']} stored={row['stored']}")
+        print(f"{len(drift)} drifted rows")
+        return 1 if drift else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
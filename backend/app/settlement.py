@@ -0,0 +1,150 @@
+"""Debt settlement strategies.
+
+Each strategy takes a list of (user_id, net_balance) pairs, where a negative
+balance means the user owes money, and returns a list of
+(from_user_id, to_user_id, amount) transfers that bring everyone to zero.
+Amounts are handled internally in integer cents and returned as Decimal, so
+no float drift can leak into the transfers; `settle_cents` takes and returns
+cents directly for callers that already have them (see app.balances).
+
+- greedy: sort once and match the largest debtor with the largest creditor
+  from both ends (the original settle-up algorithm).
+- heap: always match the current largest debtor and creditor using two heaps,
+  O(n log n), suited for groups with thousands of members.
+- exact: minimum number of transfers, found by partitioning the balances into
+  the largest number of zero-sum subsets (bitmask DP). Exponential, so only
+  used for up to EXACT_MAX_PARTICIPANTS non-zero balances; larger inputs fall
+  back to heap.
+"""
+import enum
+import heapq
+from decimal import Decimal
+from typing import Iterable, List, Tuple
+
+from app.money import from_cents, to_cents
+
+EXACT_MAX_PARTICIPANTS = 16
+
+Transfer = Tuple[int, int, Decimal]
+
+
+class SettlementStrategy(str, enum.Enum):
+    greedy = "greedy"
+    heap = "heap"
+    exact = "exact"
+
+
+def _to_cents(balances: Iterable[Tuple[int, Decimal]]) -> List[Tuple[int, int]]:
+    return [(user_id, to_cents(amount)) for user_id, amount in balances]
+
+
+def _transfers(pairs: List[Tuple[int, int, int]]) -> List[Transfer]:
+    return [(debtor, creditor, from_cents(cents)) for debtor, creditor, cents in pairs]
+
+
+def _greedy(cents: List[Tuple[int, int]]) -> List[Tuple[int, int, int]]:
+    ordered = sorted(cents, key=lambda b: b[1])
+    amounts = [amount for _, amount in ordered]
+    pairs = []
+    i, j = 0, len(ordered) - 1
+    while i < j:
+        if amounts[i] >= 0 or amounts[j] <= 0:
+            break
+        amount = min(-amounts[i], amounts[j])
+        pairs.append((ordered[i][0], ordered[j][0], amount))
+        amounts[i] += amount
+        amounts[j] -= amount
+        if amounts[i] == 0:
+            i += 1
+        if amounts[j] == 0:
+            j -= 1
+    return pairs
+
+
+def _heap(cents: List[Tuple[int, int]]) -> List[Tuple[int, int, int]]:
+    # Both heaps are max-heaps on the outstanding amount (stored negated)
+    debtors = [(amount, user_id) for user_id, amount in cents if amount < 0]
+    creditors = [(-amount, user_id) for user_id, amount in cents if amount > 0]
+    heapq.heapify(debtors)
+    heapq.heapify(creditors)
+    pairs = []
+    while debtors and creditors:
+        debt, debtor = heapq.heappop(debtors)
+        credit, creditor = heapq.heappop(creditors)
+        amount = min(-debt, -credit)
+        pairs.append((debtor, creditor, amount))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+    return pairs
+
+
+def _exact(cents: List[Tuple[int, int]]) -> List[Tuple[int, int, int]]:
+    n = len(cents)
+    if n > EXACT_MAX_PARTICIPANTS:
+        return _heap(cents)
+    amounts = [amount for _, amount in cents]
+    full = (1 << n) - 1
+
+    # subset_sum[mask] and best[mask] = max number of zero-sum groups that
+    # can be peeled off in some ordering of the members of mask
+    subset_sum = [0] * (full + 1)
+    best = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        low = mask & -mask
+        subset_sum[mask] = subset_sum[mask ^ low] + amounts[low.bit_length() - 1]
+        closes = 1 if subset_sum[mask] == 0 else 0
+        top = 0
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            rest ^= bit
+            if best[mask ^ bit] > top:
+                top = best[mask ^ bit]
+        best[mask] = top + closes
+
+    # Walk back from the full set to recover one optimal partition
+    groups, current = [], []
+    mask = full
+    while mask:
+        closes = 1 if subset_sum[mask] == 0 else 0
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            rest ^= bit
+            if best[mask ^ bit] + closes == best[mask]:
+                break
+        current.append(bit.bit_length() - 1)
+        mask ^= bit
+        if subset_sum[mask] == 0:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+
+    # Each zero-sum group of k members settles in at most k - 1 transfers
+    pairs = []
+    for group in groups:
+        pairs.extend(_greedy([cents[i] for i in group]))
+    return pairs
+
+
+_STRATEGIES = {
+    SettlementStrategy.greedy: _greedy,
+    SettlementStrategy.heap: _heap,
+    SettlementStrategy.exact: _exact,
+}
+
+
+def settle_cents(balances: Iterable[Tuple[int, int]],
+                 strategy: SettlementStrategy = SettlementStrategy.greedy) -> List[Tuple[int, int, int]]:
+    """Like settle, for balances already in integer cents; transfers are in cents too."""
+    cents = [(user_id, int(amount)) for user_id, amount in balances if amount != 0]
+    return _STRATEGIES[SettlementStrategy(strategy)](cents)
+
+
+def settle(balances: Iterable[Tuple[int, Decimal]],
+           strategy: SettlementStrategy = SettlementStrategy.greedy) -> List[Transfer]:
+    """Return (from_user_id, to_user_id, amount) transfers settling the balances."""
+    return _transfers(settle_cents(_to_cents(balances), strategy))
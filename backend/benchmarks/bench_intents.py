@@ -0,0 +1,96 @@
+"""Accuracy and latency of the local intent parser versus the LLM parser.
+
+Runs every query in intent_corpus.jsonl through app.intents.parse and reports
+coverage (queries handled locally), accuracy of the handled queries and
+p50/p99 latency. With --llm the same corpus is also sent through the LLM
+parser (needs OPENAI_API_KEY, or OPENAI_BASE_URL pointing at a compatible
+server).
+
+Usage (from backend/):
+    python -m benchmarks.bench_intents
+    python -m benchmarks.bench_intents --llm
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+CORPUS = os.path.join(os.path.dirname(__file__), "intent_corpus.jsonl")
+USERS = ["Alice", "Bob", "Charlie", "Dev Patel"]
+GROUPS = ["Goa Trip", "Weekend Trip", "Flat 4B"]
+
+
+def load_corpus():
+    with open(CORPUS) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def matches(parsed, expected):
+    if parsed is None:
+        return expected["intent"] == "unknown"
+    return all(
+        str(parsed.get(key, "")).lower() == str(value).lower()
+        for key, value in expected.items()
+    )
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(name, latencies, handled, correct, total):
+    print(f"{name}: handled {handled}/{total}, correct {correct}/{handled or 1} "
+          f"({100 * correct / (handled or 1):.1f}%), "
+          f"p50 {percentile(latencies, 50) * 1e6:.1f} us, p99 {percentile(latencies, 99) * 1e6:.1f} us, "
+          f"mean {statistics.mean(latencies) * 1e6:.1f} us")
+
+
+def bench_local(corpus, repeat):
+    from app.intents import NameIndex, parse
+
+    index = NameIndex()
+    index.load(USERS, GROUPS)
+    latencies, handled, correct = [], 0, 0
+    for case in corpus:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parsed = parse(case["query"], case["current_user"], index)
+            latencies.append(time.perf_counter() - start)
+        if parsed is not None:
+            handled += 1
+            correct += matches(parsed, case["expected"])
+    report("local", latencies, handled, correct, len(corpus))
+
+
+async def bench_llm(corpus):
+    from app.api import parse_query
+
+    latencies, correct = [], 0
+    for case in corpus:
+        start = time.perf_counter()
+        try:
+            parsed = await parse_query(case["query"], case["current_user"])
+        except Exception:
+            parsed = {"intent": "error"}
+        latencies.append(time.perf_counter() - start)
+        correct += matches(parsed, case["expected"])
+    report("llm", latencies, len(corpus), correct, len(corpus))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000, help="local parses per query")
+    parser.add_argument("--llm", action="store_true", help="also benchmark the LLM parser")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    bench_local(corpus, args.repeat)
+    if args.llm:
+        asyncio.run(bench_llm(corpus))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare settlement strategies on random groups.
+
+Usage (from backend/):
+    python -m benchmarks.bench_settlement
+    python -m benchmarks.bench_settlement --sizes 8 12 16 1000 5000 --repeat 5
+"""
+import argparse
+import random
+import time
+
+from app.settlement import EXACT_MAX_PARTICIPANTS, SettlementStrategy, settle
+
+
+def random_balances(size: int, rng: random.Random):
+    """Random per-member balances in cents that sum to zero."""
+    cents = [rng.randint(-50000, 50000) for _ in range(size - 1)]
+    cents.append(-sum(cents))
+    return [(user_id, amount / 100) for user_id, amount in enumerate(cents, start=1)]
+
+
+def check(balances, transfers):
+    remaining = {user_id: round(amount * 100) for user_id, amount in balances}
+    for from_user_id, to_user_id, amount in transfers:
+        remaining[from_user_id] += round(amount * 100)
+        remaining[to_user_id] -= round(amount * 100)
+    assert not any(remaining.values()), "transfers do not settle all balances"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 8, 12, 16, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'size':>7} {'strategy':>8} {'ms/run':>10} {'transfers':>10}")
+    for size in args.sizes:
+        cases = [random_balances(size, rng) for _ in range(args.repeat)]
+        for strategy in SettlementStrategy:
+            if strategy == SettlementStrategy.exact and size > EXACT_MAX_PARTICIPANTS:
+                continue
+            transfers = 0
+            start = time.perf_counter()
+            for balances in cases:
+                result = settle(balances, strategy)
+                transfers += len(result)
+            elapsed = (time.perf_counter() - start) / len(cases)
+            for balances in cases:
+                check(balances, settle(balances, strategy))
+            print(f"{size:>7} {strategy.value:>8} {elapsed * 1000:>10.3f} {transfers / len(cases):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
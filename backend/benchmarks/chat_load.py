@@ -0,0 +1,140 @@
+"""Load test for /chat against a local stub LLM server.
+
+Starts a stub OpenAI-compatible server that answers every completion after a
+fixed delay, runs the API on a scratch SQLite database, and fires batches of
+concurrent /chat requests. With the non-blocking chat pipeline throughput
+should grow roughly linearly with concurrency until the stub delay stops
+dominating; a blocking pipeline stays flat at about 1 / (2 * delay) req/s.
+
+Usage (from backend/):
+    python -m benchmarks.chat_load
+    python -m benchmarks.chat_load --delay 0.3 --concurrency 1 10 50 --requests 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+
+# Phrased so the local intent parser defers to the (stub) LLM
+QUERY = "Which person covered the largest share of Load Group costs?"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def stub_llm_app(delay: float):
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def completions(request):
+        body = await request.json()
+        await asyncio.sleep(delay)
+        if "parses queries" in body["messages"][0]["content"]:
+            content = json.dumps({"intent": "get_top_payer", "group_name": "Load Group"})
+        else:
+            content = "Alice paid the most in Load Group."
+        return JSONResponse({
+            "id": "stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    return Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+
+
+def serve_in_thread(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def seed():
+    from app import rollups
+    from app.database import Base, SessionLocal, engine
+    from app.models import Expense, Group, GroupMember, SplitType, User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    alice, bob = User(name="Alice"), User(name="Bob")
+    group = Group(name="Load Group")
+    db.add_all([alice, bob, group])
+    db.flush()
+    db.add_all([GroupMember(group_id=group.id, user_id=u.id) for u in (alice, bob)])
+    expense = Expense(group_id=group.id, description="Dinner", amount=100.0,
+                      paid_by_id=alice.id, split_type=SplitType.equal)
+    db.add(expense)
+    db.flush()
+    # The top-payer intent reads the rollups
+    rollups.apply_expense(db, expense, [])
+    db.commit()
+    db.close()
+
+
+async def run_batch(url: str, concurrency: int, total: int):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=60) as http:
+        async def one():
+            async with semaphore:
+                response = await http.post(url, json={"query": QUERY})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delay", type=float, default=0.2, help="stub LLM latency per call (seconds)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--requests", type=int, default=50, help="requests per concurrency level")
+    args = parser.parse_args()
+
+    llm_port, api_port = free_port(), free_port()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'chat_load.db')}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{llm_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    # Every request must reach the stub LLM, so no response caching
+    os.environ["CHAT_CACHE_BACKEND"] = "off"
+
+    from app.main import app
+
+    seed()
+    serve_in_thread(stub_llm_app(args.delay), llm_port)
+    serve_in_thread(app, api_port)
+
+    url = f"http://127.0.0.1:{api_port}/chat"
+    print(f"stub LLM delay {args.delay * 1000:.0f} ms per call, 2 calls per /chat")
+    print(f"{'concurrency':>11} {'requests':>9} {'seconds':>8} {'req/s':>8}")
+    for concurrency in args.concurrency:
+        total = max(args.requests, concurrency)
+        elapsed = asyncio.run(run_batch(url, concurrency, total))
+        print(f"{concurrency:>11} {total:>9} {elapsed:>8.2f} {total / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
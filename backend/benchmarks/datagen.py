@@ -0,0 +1,223 @@
+"""Synthetic data generator.
+
+Fills users, groups, group_members, expenses, expense_splits, the
+group_balances ledger, pairwise_debts and the daily/monthly expense rollups at
+a configurable scale. Expenses are spread evenly over DAYS days from START in
+id order. Output is deterministic for a
+given seed, so benchmark runs on different commits see identical data.
+Expenses use equal and percentage splits (see --percentage-ratio); shares are
+allocated with app.money.allocate, so they always sum to the amount and the
+ledger matches `python -m app.ledger verify`.
+
+Presets (splits = expenses * members):
+    small    200 users,    20 groups,  8 members,   2,000 expenses  ->    16k splits
+    medium   2,000 users,  200 groups, 10 members,  50,000 expenses ->   500k splits
+    large    10,000 users, 1,000 groups, 10 members, 500,000 expenses -> 5M splits
+
+Usage (from backend/, on an empty migrated database):
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.datagen --scale medium
+    python -m benchmarks.datagen --users 10000 --groups 1000 --members 10 --expenses 500000 --large-group 10000
+"""
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+
+from app.money import allocate, from_cents
+
+CHUNK = 5000
+START = datetime(2025, 1, 1)
+DAYS = 365
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int
+    groups: int
+    members: int
+    expenses: int
+    # One extra group with this many members (0 for none), for large-group benchmarks
+    large_group: int = 0
+    large_group_expenses: int = 20
+    percentage_ratio: float = 0.3
+
+
+SCALES = {
+    "small": Scale(users=200, groups=20, members=8, expenses=2000),
+    "medium": Scale(users=2000, groups=200, members=10, expenses=50000),
+    "large": Scale(users=10000, groups=1000, members=10, expenses=500000),
+}
+
+
+def random_percentages(n: int, rng: random.Random):
+    """n positive whole percentages that add up to 100 (n <= 100)."""
+    cuts = sorted(rng.sample(range(1, 100), n - 1))
+    return [b - a for a, b in zip([0] + cuts, cuts + [100])]
+
+
+def insert_chunks(conn, table, rows):
+    for start in range(0, len(rows), CHUNK):
+        conn.execute(table.insert(), rows[start:start + CHUNK])
+
+
+def flush_rollups(conn, table, totals, before):
+    """Insert and forget the rollup rows of periods before `before` (None: all)."""
+    rows = []
+    for g, period, u in sorted(key for key in totals if before is None or key[1] < before):
+        paid, count, owed = totals.pop((g, period, u))
+        rows.append({"group_id": g, "period": period, "user_id": u,
+                     "paid": from_cents(paid), "paid_count": count, "owed": from_cents(owed)})
+    insert_chunks(conn, table, rows)
+
+
+def generate(engine, scale: Scale, seed: int = 42) -> dict:
+    """Populate an empty database. Returns the number of rows per table."""
+    from app.models import (
+        Expense, ExpenseRollupDaily, ExpenseRollupMonthly, ExpenseSplit, Group, GroupBalance, GroupMember,
+        PairwiseDebt, SplitType, User,
+    )
+
+    rng = random.Random(seed)
+    members_by_group = {}
+    with engine.begin() as conn:
+        insert_chunks(conn, User.__table__, [
+            {"id": i, "name": f"user{i}"} for i in range(1, scale.users + 1)
+        ])
+        group_count = scale.groups + (1 if scale.large_group else 0)
+        insert_chunks(conn, Group.__table__, [
+            {"id": g, "name": f"group{g}"} for g in range(1, group_count + 1)
+        ])
+        for g in range(1, scale.groups + 1):
+            members_by_group[g] = sorted(rng.sample(range(1, scale.users + 1), min(scale.members, scale.users)))
+        if scale.large_group:
+            members_by_group[group_count] = list(range(1, min(scale.large_group, scale.users) + 1))
+        insert_chunks(conn, GroupMember.__table__, [
+            {"group_id": g, "user_id": u} for g, users in members_by_group.items() for u in users
+        ])
+
+    # Expenses are spread evenly over the regular groups, then the large group's
+    expense_groups = [1 + i % scale.groups for i in range(scale.expenses)]
+    if scale.large_group:
+        expense_groups += [group_count] * scale.large_group_expenses
+    balances = defaultdict(int)
+    pairs = defaultdict(int)
+    # Times grow with the id, so a chunk only leaves its last day and month open
+    days = defaultdict(lambda: [0, 0, 0])
+    months = defaultdict(lambda: [0, 0, 0])
+    step = timedelta(days=DAYS) / len(expense_groups)
+    split_count = 0
+    for start in range(0, len(expense_groups), CHUNK):
+        expenses, splits = [], []
+        for offset, g in enumerate(expense_groups[start:start + CHUNK]):
+            expense_id = start + offset + 1
+            created_at = START + step * (expense_id - 1)
+            day, month = created_at.date(), created_at.date().replace(day=1)
+            members = members_by_group[g]
+            amount = rng.randint(100, 50000)
+            payer = rng.choice(members)
+            if rng.random() < scale.percentage_ratio and len(members) <= 100:
+                split_type = SplitType.percentage
+                percentages = random_percentages(len(members), rng)
+                shares = allocate(amount, percentages)
+            else:
+                split_type = SplitType.equal
+                percentages = [None] * len(members)
+                shares = allocate(amount, [1] * len(members))
+            expenses.append({
+                "id": expense_id, "group_id": g, "description": f"expense {expense_id}",
+                "amount": from_cents(amount), "paid_by_id": payer, "split_type": split_type,
+                "created_at": created_at,
+            })
+            balances[(g, payer)] += amount
+            for totals, period in ((days, day), (months, month)):
+                totals[(g, period, payer)][0] += amount
+                totals[(g, period, payer)][1] += 1
+            for user_id, share, percentage in zip(members, shares, percentages):
+                splits.append({
+                    "expense_id": expense_id, "user_id": user_id,
+                    "share_amount": from_cents(share), "percentage": percentage,
+                })
+                balances[(g, user_id)] -= share
+                days[(g, day, user_id)][2] += share
+                months[(g, month, user_id)][2] += share
+                if user_id < payer:
+                    pairs[(g, user_id, payer)] += share
+                elif user_id > payer:
+                    pairs[(g, payer, user_id)] -= share
+        with engine.begin() as conn:
+            conn.execute(Expense.__table__.insert(), expenses)
+            insert_chunks(conn, ExpenseSplit.__table__, splits)
+            flush_rollups(conn, ExpenseRollupDaily.__table__, days, day)
+            flush_rollups(conn, ExpenseRollupMonthly.__table__, months, month)
+        split_count += len(splits)
+
+    with engine.begin() as conn:
+        insert_chunks(conn, GroupBalance.__table__, [
+            {"group_id": g, "user_id": u, "net_balance": from_cents(balances[(g, u)])}
+            for g, users in members_by_group.items() for u in users
+        ])
+        insert_chunks(conn, PairwiseDebt.__table__, [
+            {"group_id": g, "user_id": u, "other_user_id": o, "amount": from_cents(cents)}
+            for (g, u, o), cents in pairs.items() if cents
+        ])
+        flush_rollups(conn, ExpenseRollupDaily.__table__, days, None)
+        flush_rollups(conn, ExpenseRollupMonthly.__table__, months, None)
+        if engine.dialect.name == "postgresql":
+            for table in ("users", "groups", "expenses"):
+                conn.exec_driver_sql(f"SELECT setval('{table}_id_seq', (SELECT max(id) FROM {table}))")
+    return {
+        "users": scale.users,
+        "groups": group_count,
+        "group_members": sum(len(users) for users in members_by_group.values()),
+        "expenses": len(expense_groups),
+        "expense_splits": split_count,
+    }
+
+
+def scale_from_args(args) -> Scale:
+    scale = SCALES[args.scale]
+    overrides = {
+        field: getattr(args, field)
+        for field in ("users", "groups", "members", "expenses", "large_group", "percentage_ratio")
+        if getattr(args, field) is not None
+    }
+    return replace(scale, **overrides)
+
+
+def add_scale_arguments(parser):
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--groups", type=int)
+    parser.add_argument("--members", type=int, help="members per group")
+    parser.add_argument("--expenses", type=int)
+    parser.add_argument("--large-group", type=int, help="add one group with this many members")
+    parser.add_argument("--percentage-ratio", type=float, help="share of expenses split by percentage")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    from sqlalchemy import func, select
+
+    from app.database import engine
+    from app.models import User
+
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(User)).scalar():
+            print("database already has users; run against an empty, migrated database", file=sys.stderr)
+            return 1
+    start = time.perf_counter()
+    counts = generate(engine, scale_from_args(args), args.seed)
+    print(", ".join(f"{count} {table}" for table, count in counts.items()))
+    print(f"generated in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
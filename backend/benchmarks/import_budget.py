@@ -0,0 +1,83 @@
+"""Check that importing the app stays fast and heavy dependencies stay lazy.
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters and
+takes the fastest of --runs. Exits non-zero if the import takes longer than
+--budget-ms, or if any module in LAZY_MODULES is imported at startup. Those
+are loaded on first use or by the background warm-up in app.health. The time
+budget depends on the machine, so set it to suit CI.
+
+Usage (from backend/):
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 800 --runs 5 --top 20
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+# Imported lazily by the app; importing any of them at startup is a regression
+LAZY_MODULES = ("openai", "numpy", "pyarrow")
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(target: str, env: dict):
+    """[(module, self_us, cumulative_us)] for one fresh import of target."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True, env=env, cwd=os.path.join(os.path.dirname(__file__), ".."),
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {target} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            rows.append((match[4], int(match[1]), int(match[2])))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="slowest packages to list")
+    args = parser.parse_args()
+
+    # Engines are created at import, so point them at a driver that is always installed
+    env = {
+        **os.environ,
+        "DATABASE_URL": os.environ.get("DATABASE_URL")
+        or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'import.db')}",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "unused"),
+    }
+    runs = [import_times(args.target, env) for _ in range(args.runs)]
+    totals = [next(cumulative for module, _, cumulative in rows if module == args.target) for rows in runs]
+    best = runs[totals.index(min(totals))]
+    total_ms = min(totals) / 1000
+
+    packages = defaultdict(int)
+    for module, self_us, _ in best:
+        packages[module.split(".")[0]] += self_us
+    print(f"{'package':<24} {'ms':>8}")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<24} {self_us / 1000:>8.1f}")
+
+    failed = False
+    imported = {module.split(".")[0] for module, _, _ in best}
+    for module in LAZY_MODULES:
+        if module in imported:
+            print(f"{module} is imported at startup; it should be loaded lazily")
+            failed = True
+    status = "ok" if total_ms <= args.budget_ms else "OVER BUDGET"
+    failed |= total_ms > args.budget_ms
+    print(f"import {args.target}: {total_ms:.1f} ms (best of {args.runs}) / {args.budget_ms:.0f} ms {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
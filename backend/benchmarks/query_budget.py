@@ -0,0 +1,124 @@
+"""Check that read endpoints stay within a fixed SQL statement budget.
+
+Seeds a throwaway SQLite database with many groups, calls each endpoint
+through the FastAPI test client and counts the statements it issues.
+The budgets do not depend on the number of groups, members or expenses,
+so any N+1 regression makes the script exit non-zero.
+
+Usage (from backend/):
+    python -m benchmarks.query_budget
+    python -m benchmarks.query_budget --groups 500 --members 8 --expenses 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# Point the app at a scratch database before it creates its engine
+_tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'budget.db')}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import Base, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+Base.metadata.create_all(bind=engine)
+
+# Maximum statements per request, independent of data size. Versioned group
+# endpoints spend one lookup before and one after computing a response.
+BUDGETS = {
+    "GET /groups": 6,
+    "GET /groups/{id}": 6,
+    "GET /groups/{id}/balances": 4,
+    "GET /groups/{id}/stats": 5,
+    "GET /users/{id}/balances": 2,
+    "GET /users": 1,
+    "GET /users/{id}/debts": 2,
+    "GET /users/{a}/debts/{b}": 2,
+    "GET /settlements": 1,
+}
+
+# Repeat requests for an unchanged group are served from the response cache
+CACHED_BUDGETS = {
+    "GET /groups": 1,
+    "GET /groups/{id}": 1,
+    "GET /groups/{id}/balances": 1,
+    "GET /groups/{id}/stats": 1,
+}
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed(client: TestClient, groups: int, members: int, expenses: int):
+    user_ids = [
+        client.post("/users", json={"name": f"user{i}"}).json()["id"]
+        for i in range(members * 2)
+    ]
+    for g in range(groups):
+        member_ids = user_ids[g % 2::2][:members]
+        group_id = client.post("/groups", json={"name": f"group{g}", "user_ids": member_ids}).json()["id"]
+        for e in range(expenses):
+            client.post(f"/groups/{group_id}/expenses", json={
+                "description": f"expense{e}",
+                "amount": 10 + e,
+                "paid_by": member_ids[e % len(member_ids)],
+                "split_type": "equal",
+                "splits": [{"user_id": user_id} for user_id in member_ids],
+            })
+    return user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--members", type=int, default=5)
+    parser.add_argument("--expenses", type=int, default=3)
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    user_ids = seed(client, args.groups, args.members, args.expenses)
+    paths = {
+        "GET /groups": "/groups",
+        "GET /groups/{id}": "/groups/1",
+        "GET /groups/{id}/balances": "/groups/1/balances",
+        "GET /groups/{id}/stats": "/groups/1/stats?from=2020-01-15&granularity=month",
+        "GET /users/{id}/balances": f"/users/{user_ids[0]}/balances",
+        "GET /users": "/users",
+        "GET /users/{id}/debts": f"/users/{user_ids[0]}/debts",
+        "GET /users/{a}/debts/{b}": f"/users/{user_ids[0]}/debts/{user_ids[2]}",
+        "GET /settlements": "/settlements",
+    }
+
+    checks = [(name, path, BUDGETS[name]) for name, path in paths.items()]
+    checks += [(f"{name} (cached)", paths[name], budget) for name, budget in CACHED_BUDGETS.items()]
+    failed = False
+    for name, path, budget in checks:
+        with count_queries() as statements:
+            response = client.get(path)
+        response.raise_for_status()
+        status = "ok" if len(statements) <= budget else "OVER BUDGET"
+        failed |= len(statements) > budget
+        print(f"{name:<37} {len(statements):>4} / {budget:<4} {status}")
+        if len(statements) > budget:
+            for statement in statements:
+                print(f"    {' '.join(statement.split())[:120]}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Initial schema
+
+Databases created by the old Base.metadata.create_all() at startup already
+have these tables; they are only created when missing, so such databases
+upgrade in place. The group_balances ledger is filled from their expenses.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+    if "groups" not in existing:
+        op.create_table(
+            "groups",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+        )
+        op.create_index("ix_groups_id", "groups", ["id"])
+    if "group_members" not in existing:
+        op.create_table(
+            "group_members",
+            sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id"), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        )
+    if "expenses" not in existing:
+        op.create_table(
+            "expenses",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id")),
+            sa.Column("description", sa.String(), nullable=False),
+            sa.Column("amount", sa.Float(), nullable=False),
+            sa.Column("paid_by_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("split_type", sa.Enum("equal", "percentage", name="splittype"), nullable=False),
+        )
+        op.create_index("ix_expenses_id", "expenses", ["id"])
+    if "expense_splits" not in existing:
+        op.create_table(
+            "expense_splits",
+            sa.Column("expense_id", sa.Integer(), sa.ForeignKey("expenses.id"), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("share_amount", sa.Float(), nullable=False),
+            sa.Column("percentage", sa.Float(), nullable=True),
+        )
+    if "group_balances" not in existing:
+        op.create_table(
+            "group_balances",
+            sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id"), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("net_balance", sa.Float(), nullable=False),
+        )
+    # Databases from before the ledger have expenses but no balances: fill
+    # one row per member and expense participant (0003 converts it to cents)
+    if not op.get_bind().execute(sa.text("SELECT 1 FROM group_balances LIMIT 1")).first():
+        op.execute(
+            "INSERT INTO group_balances (group_id, user_id, net_balance) "
+            "SELECT group_id, user_id, SUM(amount) FROM ("
+            "SELECT group_id, user_id, 0 AS amount FROM group_members "
+            "UNION ALL "
+            "SELECT group_id, paid_by_id, amount FROM expenses "
+            "UNION ALL "
+            "SELECT e.group_id, s.user_id, -s.share_amount "
+            "FROM expense_splits s JOIN expenses e ON e.id = s.expense_id"
+            ") AS ledger GROUP BY group_id, user_id"
+        )
+
+
+def downgrade():
+    op.drop_table("group_balances")
+    op.drop_table("expense_splits")
+    op.drop_table("expenses")
+    op.drop_table("group_members")
+    op.drop_table("groups")
+    op.drop_table("users")
+    sa.Enum(name="splittype").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,38 @@
+"""Indexes for hot query paths
+
+Foreign keys used for filtering, keyset pagination and case-insensitive
+name lookups from /chat.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The composite expense indexes may already exist on databases created
+    # with create_all() after they were added to the models
+    op.create_index("ix_expenses_group_id_id", "expenses", ["group_id", "id"], if_not_exists=True)
+    op.create_index("ix_expenses_paid_by_id_id", "expenses", ["paid_by_id", "id"], if_not_exists=True)
+    op.create_index("ix_expense_splits_user_id", "expense_splits", ["user_id", "expense_id"])
+    op.create_index("ix_group_members_user_id", "group_members", ["user_id"])
+    op.create_index("ix_users_name_lower", "users", [sa.text("lower(name)")])
+    op.create_index("ix_groups_name_lower", "groups", [sa.text("lower(name)")])
+
+
+def downgrade():
+    op.drop_index("ix_groups_name_lower", table_name="groups")
+    op.drop_index("ix_users_name_lower", table_name="users")
+    op.drop_index("ix_group_members_user_id", table_name="group_members")
+    op.drop_index("ix_expense_splits_user_id", table_name="expense_splits")
+    op.drop_index("ix_expenses_paid_by_id_id", table_name="expenses")
+    op.drop_index("ix_expenses_group_id_id", table_name="expenses")
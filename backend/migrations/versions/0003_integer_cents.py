@@ -0,0 +1,88 @@
+"""Store money as integer cents
+
+Converts expenses.amount, expense_splits.share_amount and
+group_balances.net_balance from floating point to BIGINT cents. Each
+expense's splits are re-allocated by largest remainder (weighted by the old
+float shares) so they sum exactly to the expense amount, and the balance
+ledger is recomputed from the converted rows.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.money import allocate
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = [
+    ("expenses", "amount"),
+    ("expense_splits", "share_amount"),
+    ("group_balances", "net_balance"),
+]
+BATCH_EXPENSES = 10000
+
+
+def set_column_type(table, column, type_, using):
+    if op.get_bind().dialect.name == "postgresql":
+        op.alter_column(table, column, type_=type_, postgresql_using=using)
+    else:
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column(column, type_=type_)
+
+
+def reallocate_splits(bind):
+    """Rewrite split shares as whole cents that sum to their expense amount."""
+    max_id = bind.execute(sa.text("SELECT MAX(id) FROM expenses")).scalar() or 0
+    for start in range(0, max_id + 1, BATCH_EXPENSES):
+        rows = bind.execute(sa.text(
+            "SELECT s.expense_id, e.amount, s.user_id, s.share_amount "
+            "FROM expense_splits s JOIN expenses e ON e.id = s.expense_id "
+            "WHERE s.expense_id >= :lo AND s.expense_id < :hi "
+            "ORDER BY s.expense_id, s.user_id"
+        ), {"lo": start, "hi": start + BATCH_EXPENSES}).fetchall()
+        updates = []
+        for expense_id, splits in groupby(rows, key=lambda row: row[0]):
+            splits = list(splits)
+            amount_cents = int(splits[0][1])
+            weights = [max(share, 0) for _, _, _, share in splits]
+            if sum(weights) == 0:
+                weights = [1] * len(splits)
+            for (_, _, user_id, _), cents in zip(splits, allocate(amount_cents, weights)):
+                updates.append({"cents": cents, "expense_id": expense_id, "user_id": user_id})
+        if updates:
+            bind.execute(sa.text(
+                "UPDATE expense_splits SET share_amount = :cents "
+                "WHERE expense_id = :expense_id AND user_id = :user_id"
+            ), updates)
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.execute("UPDATE expenses SET amount = ROUND(amount * 100)")
+    reallocate_splits(bind)
+    for table, column in MONEY_COLUMNS:
+        set_column_type(table, column, sa.BigInteger(), f"ROUND({column})::bigint")
+    op.execute(
+        "UPDATE group_balances SET net_balance = "
+        "COALESCE((SELECT SUM(e.amount) FROM expenses e "
+        "WHERE e.group_id = group_balances.group_id AND e.paid_by_id = group_balances.user_id), 0) - "
+        "COALESCE((SELECT SUM(s.share_amount) FROM expense_splits s JOIN expenses e ON e.id = s.expense_id "
+        "WHERE e.group_id = group_balances.group_id AND s.user_id = group_balances.user_id), 0)"
+    )
+
+
+def downgrade():
+    for table, column in MONEY_COLUMNS:
+        set_column_type(table, column, sa.Float(), f"{column} / 100.0")
+        if op.get_bind().dialect.name != "postgresql":
+            op.execute(f"UPDATE {table} SET {column} = {column} / 100.0")
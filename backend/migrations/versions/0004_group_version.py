@@ -0,0 +1,33 @@
+"""Group version counter
+
+Adds groups.version, bumped by every write that changes a group's read
+endpoints; ETags and the response cache are keyed on it.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("groups", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_column("groups", "version")
+        return
+    # SQLite rebuilds the table and cannot reflect the expression index, so
+    # the copy loses it; recreate it for 0002's downgrade
+    with op.batch_alter_table("groups") as batch:
+        batch.drop_column("version")
+    op.create_index("ix_groups_name_lower", "groups", [sa.text("lower(name)")])
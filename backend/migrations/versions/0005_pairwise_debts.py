@@ -0,0 +1,50 @@
+"""Pairwise debt index
+
+Adds pairwise_debts, the net amount each pair of users owes each other per
+group, and fills it from the existing expense splits (every split of a user
+other than the payer is a debt from that user to the payer).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "pairwise_debts",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("other_user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("amount", sa.BigInteger(), nullable=False),
+    )
+    op.create_index("ix_pairwise_debts_user_id", "pairwise_debts", ["user_id", "other_user_id"])
+    op.create_index("ix_pairwise_debts_other_user_id", "pairwise_debts", ["other_user_id", "user_id"])
+    # Amounts are integer cents since 0003
+    op.execute(
+        "INSERT INTO pairwise_debts (group_id, user_id, other_user_id, amount) "
+        "SELECT e.group_id, "
+        "CASE WHEN s.user_id < e.paid_by_id THEN s.user_id ELSE e.paid_by_id END, "
+        "CASE WHEN s.user_id < e.paid_by_id THEN e.paid_by_id ELSE s.user_id END, "
+        "SUM(CASE WHEN s.user_id < e.paid_by_id THEN s.share_amount ELSE -s.share_amount END) "
+        "FROM expense_splits s JOIN expenses e ON e.id = s.expense_id "
+        "WHERE s.user_id <> e.paid_by_id "
+        "GROUP BY e.group_id, "
+        "CASE WHEN s.user_id < e.paid_by_id THEN s.user_id ELSE e.paid_by_id END, "
+        "CASE WHEN s.user_id < e.paid_by_id THEN e.paid_by_id ELSE s.user_id END"
+    )
+
+
+def downgrade():
+    op.drop_index("ix_pairwise_debts_other_user_id", table_name="pairwise_debts")
+    op.drop_index("ix_pairwise_debts_user_id", table_name="pairwise_debts")
+    op.drop_table("pairwise_debts")
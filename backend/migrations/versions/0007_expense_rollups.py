@@ -0,0 +1,67 @@
+"""Expense timestamps and rollups
+
+Adds expenses.created_at and the daily and monthly expense rollups per
+(group, period, user). Expenses created before this migration have no
+recorded time, so they are stamped with the migration time and rolled up
+into the current day and month.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+ROLLUP_TABLES = ("expense_rollups_daily", "expense_rollups_monthly")
+
+
+def upgrade():
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    op.add_column("expenses", sa.Column("created_at", sa.DateTime(), nullable=True))
+    op.get_bind().execute(
+        sa.text("UPDATE expenses SET created_at = :now").bindparams(sa.bindparam("now", type_=sa.DateTime())),
+        {"now": now},
+    )
+    with op.batch_alter_table("expenses") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+
+    for table in ROLLUP_TABLES:
+        op.create_table(
+            table,
+            sa.Column("group_id", sa.Integer(), sa.ForeignKey("groups.id"), primary_key=True),
+            sa.Column("period", sa.Date(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("paid", sa.BigInteger(), nullable=False),
+            sa.Column("paid_count", sa.Integer(), nullable=False),
+            sa.Column("owed", sa.BigInteger(), nullable=False),
+        )
+    op.create_index("ix_expense_rollups_monthly_user_id", "expense_rollups_monthly", ["user_id", "group_id"])
+
+    # Amounts are integer cents since 0003
+    for table, period in zip(ROLLUP_TABLES, (now.date(), now.date().replace(day=1))):
+        op.get_bind().execute(sa.text(
+            f"INSERT INTO {table} (group_id, period, user_id, paid, paid_count, owed) "
+            "SELECT group_id, :period, user_id, SUM(paid), SUM(paid_count), SUM(owed) FROM ("
+            "SELECT group_id, paid_by_id AS user_id, amount AS paid, 1 AS paid_count, 0 AS owed FROM expenses "
+            "UNION ALL "
+            "SELECT e.group_id, s.user_id, 0, 0, s.share_amount "
+            "FROM expense_splits s JOIN expenses e ON e.id = s.expense_id"
+            ") AS spend GROUP BY group_id, user_id"
+        ).bindparams(sa.bindparam("period", type_=sa.Date())), {"period": period})
+
+
+def downgrade():
+    op.drop_index("ix_expense_rollups_monthly_user_id", table_name="expense_rollups_monthly")
+    for table in reversed(ROLLUP_TABLES):
+        op.drop_table(table)
+    with op.batch_alter_table("expenses") as batch:
+        batch.drop_column("created_at")